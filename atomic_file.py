@@ -0,0 +1,41 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+STAGE_PREFIX = ".tmp-"
+
+
+@contextmanager
+def staged_file(directory, suffix=""):
+    """Yield the path of a new empty file in directory, removed on exit unless it was renamed away.
+
+    Staging next to the destination keeps the final ``os.replace`` on one
+    filesystem, so readers see either the old file or the complete new one.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=STAGE_PREFIX, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_name
+    finally:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+
+
+def write_atomically(destination, write, suffix="", sync=False):
+    """Run write(temporary path) next to destination and rename the result into place.
+
+    With sync the data is flushed to disk before the rename, so after a crash
+    the destination holds either the old or the new content.
+    """
+    directory = os.path.dirname(os.path.abspath(destination))
+    with staged_file(directory, suffix) as tmp_name:
+        write(tmp_name)
+        if sync:
+            fd = os.open(tmp_name, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.replace(tmp_name, destination)
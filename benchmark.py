@@ -0,0 +1,222 @@
+"""Synthetic load benchmark for FileRevisionManager.
+
+Generates a workload of monitored files, modifies them at a fixed rate while
+the real observer and revision path are running, and reports event-to-revision
+latency, throughput, I/O per revision, peak RSS and watch counts as JSON.
+
+Example:
+    python benchmark.py --files 200 --dirs 10 --size 65536 --rate 100 --duration 20 --output run.json
+"""
+import os
+import csv
+import sys
+import json
+import shutil
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_process_io():
+    """Bytes read and written through syscalls by this process (Linux only)."""
+    try:
+        with open("/proc/self/io") as file:
+            fields = dict(line.split(": ") for line in file.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Workload:
+    """Monitored files spread over a number of directories, plus their configuration."""
+
+    def __init__(self, root, file_count, dir_count, file_size, seed):
+        self.root = root
+        self.file_size = file_size
+        self.random = random.Random(seed)
+        self.files = []
+        for index in range(file_count):
+            directory = os.path.join(root, f"dir{index % dir_count:04d}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"file{index:06d}.dat")
+            with open(path, "wb") as file:
+                file.write(self.random.randbytes(file_size))
+            self.files.append(path)
+
+    def write_config(self, config_path):
+        with open(config_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=["file_path", "revision_dir"])
+            writer.writeheader()
+            # One revisions directory per file, so every duplicate check compares a file with
+            # its own previous revision.
+            for path in self.files:
+                writer.writerow({"file_path": path, "revision_dir": os.path.basename(path) + ".revisions"})
+
+    def modify(self, path, duplicate):
+        """Rewrite path; a duplicate write saves the current content again unchanged.
+
+        Returns the number of bytes the generator itself read and wrote.
+        """
+        with open(path, "rb") as file:
+            data = bytearray(file.read())
+        if not duplicate:
+            offset = self.random.randrange(max(1, len(data) - 64))
+            data[offset:offset + 64] = self.random.randbytes(64)
+        with open(path, "wb") as file:
+            file.write(data)
+        return len(data), len(data)
+
+
+def run(args):
+    root = tempfile.mkdtemp(prefix="frm-bench-")
+    os.chdir(root)  # The manager reads file_config.csv and writes its log in the working directory
+
+    from file_revisioning import FileRevisionManager
+    logging.getLogger().setLevel(logging.WARNING)
+
+    workload = Workload(root, args.files, args.dirs, args.size, args.seed)
+    workload.write_config(os.path.join(root, "file_config.csv"))
+
+    manager_options = {"hash_algorithm": args.hash, "quiet_period": args.quiet_period,
+                       "max_delay": args.max_delay, "workers": args.workers}
+    if args.storage == "blob":
+        manager_options["blob_store_dir"] = os.path.join(root, "blobs")
+    elif args.storage == "delta":
+        manager_options["delta_storage"] = True
+    manager = FileRevisionManager(**manager_options)
+
+    lock = threading.Lock()
+    pending = {}  # path -> time of the first write not yet captured in a revision
+    latencies = []
+
+    def on_revision(file_path, revisions_dir, record):
+        now = time.perf_counter()
+        with lock:
+            started = pending.pop(str(file_path), None)
+            if started is not None:
+                latencies.append(now - started)
+
+    manager.revision_listeners.append(on_revision)
+
+    start_setup = time.perf_counter()
+    manager.start_monitoring()
+    setup_seconds = time.perf_counter() - start_setup
+
+    read_before, written_before = read_process_io()
+    interval = 1.0 / args.rate
+    writes = duplicates = generator_read = generator_written = 0
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_write = started
+    while next_write < deadline:
+        delay = next_write - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        path = workload.random.choice(workload.files)
+        duplicate = workload.random.random() < args.duplicate_ratio
+        with lock:
+            if not duplicate:
+                pending.setdefault(path, time.perf_counter())
+        read, written = workload.modify(path, duplicate)
+        generator_read += read
+        generator_written += written
+        writes += 1
+        duplicates += duplicate
+        next_write += interval
+
+    # Give the last bursts time to settle before shutting down.
+    time.sleep(args.max_delay + args.quiet_period)
+    elapsed = time.perf_counter() - started
+    watches = len(manager.watches)
+    manager.stop_monitoring()
+    read_after, written_after = read_process_io()
+
+    revisions = manager.revisions_created.value
+    result = {
+        "parameters": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "setup_seconds": setup_seconds,
+        "writes": writes,
+        "duplicate_writes": duplicates,
+        "revisions": revisions,
+        "duplicates_skipped": manager.duplicates_skipped.value,
+        "latency_samples": len(latencies),
+        "uncaptured_writes": len(pending),
+        "revisions_per_second": revisions / elapsed if elapsed else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+        },
+        "peak_rss_bytes": peak_rss_bytes(),
+        "watches": watches,
+        "stage_mean_seconds": {stage: total / count
+                               for stage, (count, total) in sorted(manager.stage_seconds.totals().items())},
+    }
+    if read_before is not None and revisions:
+        # The workload generator's own reads and writes are subtracted out.
+        result["bytes_read_per_revision"] = (read_after - read_before - generator_read) / revisions
+        result["bytes_written_per_revision"] = (written_after - written_before - generator_written) / revisions
+
+    if not args.keep:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark event-to-revision latency and throughput")
+    parser.add_argument("--files", type=int, default=100, help="number of monitored files")
+    parser.add_argument("--dirs", type=int, default=10, help="number of directories the files are spread over")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="size of each file in bytes")
+    parser.add_argument("--rate", type=float, default=50.0, help="modifications per second across all files")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to generate load for")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2,
+                        help="fraction of writes that save identical content")
+    parser.add_argument("--storage", choices=("copy", "blob", "delta"), default="copy")
+    parser.add_argument("--hash", default="md5", help="hash algorithm")
+    parser.add_argument("--quiet-period", type=float, default=0.5)
+    parser.add_argument("--max-delay", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=4, help="revision worker threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the generated workload directory")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    result = json.dumps(run(args), indent=4)
+    if output:
+        with open(output, "w") as file:
+            file.write(result + "\n")
+    else:
+        print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import os
+import csv
+import json
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import write_atomically
+
+CONFIG_FILE = 'file_config.csv'
+JOURNAL_SUFFIX = '.journal'
+FIELDNAMES = ['file_path', 'revision_dir', 'watcher']
+# How a file is watched: 'auto' picks stat polling on network/FUSE/overlay filesystems
+# and native events elsewhere; 'polling' and 'native' force one or the other.
+WATCHERS = ('auto', 'polling', 'native')
+COMPACT_THRESHOLD = 1000
+VALIDATION_WORKERS = 16
+
+
+def _config_key(file_path):
+    # Stored paths are normalized the same way FILE_PATHS keys are, so edits made
+    # through a Path always find the row that was read from the CSV.
+    return str(Path(file_path))
+
+
+def _set_watcher(watchers, key, watcher):
+    if watcher == 'auto':
+        watchers.pop(key, None)
+    else:
+        watchers[key] = watcher
+
+
+class ConfigStore:
+    """The monitored-file configuration: ``file_config.csv`` plus a change journal.
+
+    Single-entry edits are appended to ``file_config.csv.journal`` instead of
+    rewriting the CSV. Once the journal grows past COMPACT_THRESHOLD entries it
+    is folded back into the CSV, which is always replaced atomically (write to
+    a temporary file, then rename), so a crash never leaves a half-written
+    configuration behind.
+
+    The optional ``watcher`` column chooses how a file is watched (see
+    WATCHERS); only files with a watcher other than 'auto' are kept in
+    ``watchers``.
+    """
+
+    def __init__(self, config_file=CONFIG_FILE):
+        self.config_file = config_file
+        self.journal_file = config_file + JOURNAL_SUFFIX
+        self.entries = {}
+        self.watchers = {}
+        self._journal_length = 0
+        self._known_signature = None
+
+    def load(self):
+        """Read the CSV and replay the journal. Returns {file_path string: revision_dir}."""
+        entries, watchers = {}, {}
+        if not os.path.exists(self.config_file):
+            logging.warning(f"{self.config_file} not found, creating...")
+            self._write_csv({}, {})
+
+        # Taken before reading: a write that lands while we read shows up as a change.
+        signature = self._signature()
+        with open(self.config_file, mode='r', newline='') as file:
+            for row in csv.DictReader(file):
+                key = _config_key(row['file_path'])
+                entries[key] = row['revision_dir']
+                # Files written before the column existed have no watcher field.
+                if row.get('watcher') and row['watcher'] != 'auto':
+                    watchers[key] = row['watcher']
+
+        journal_length = 0
+        try:
+            with open(self.journal_file, mode='r') as file:
+                for line in file:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append; everything before it is intact.
+                        logging.warning(f"Ignoring corrupt line in {self.journal_file}")
+                        continue
+                    if change['op'] == 'set':
+                        entries[_config_key(change['file_path'])] = change['revision_dir']
+                    elif change['op'] == 'delete':
+                        entries.pop(_config_key(change['file_path']), None)
+                        watchers.pop(_config_key(change['file_path']), None)
+                    elif change['op'] == 'watcher':
+                        _set_watcher(watchers, _config_key(change['file_path']), change['watcher'])
+                    journal_length += 1
+        except FileNotFoundError:
+            pass
+
+        self.entries = entries
+        self.watchers = watchers
+        self._journal_length = journal_length
+        self._known_signature = signature
+        return dict(entries)
+
+    def _signature(self):
+        signature = []
+        for path in (self.config_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def changed_on_disk(self):
+        """True if the files were changed by another writer since this store last read or wrote them."""
+        return self._signature() != self._known_signature
+
+    def set(self, file_path, revision_dir):
+        file_path = _config_key(file_path)
+        self.entries[file_path] = revision_dir
+        self._append({'op': 'set', 'file_path': file_path, 'revision_dir': revision_dir})
+
+    def delete(self, file_path):
+        file_path = _config_key(file_path)
+        if self.entries.pop(file_path, None) is not None:
+            self.watchers.pop(file_path, None)
+            self._append({'op': 'delete', 'file_path': file_path})
+
+    def set_watcher(self, file_path, watcher):
+        if watcher not in WATCHERS:
+            raise ValueError(f"Unknown watcher {watcher!r}, expected one of {', '.join(WATCHERS)}")
+        file_path = _config_key(file_path)
+        _set_watcher(self.watchers, file_path, watcher)
+        self._append({'op': 'watcher', 'file_path': file_path, 'watcher': watcher})
+
+    def update(self, entries):
+        """Apply a batch of (file_path, revision_dir) pairs with a single rewrite."""
+        for file_path, revision_dir in entries:
+            self.entries[_config_key(file_path)] = revision_dir
+        self.compact()
+
+    def compact(self):
+        """Fold the journal into the CSV and start a new, empty journal."""
+        self._write_csv(self.entries, self.watchers)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_length = 0
+        self._known_signature = self._signature()
+
+    def _append(self, change):
+        with open(self.journal_file, mode='a') as file:
+            file.write(json.dumps(change) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_length += 1
+        self._known_signature = self._signature()
+        if self._journal_length >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def _write_csv(self, entries, watchers):
+        def write(tmp_name):
+            with open(tmp_name, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(FIELDNAMES)
+                writer.writerows((file_path, revision_dir, watchers.get(file_path, ''))
+                                 for file_path, revision_dir in entries.items())
+
+        write_atomically(self.config_file, write, suffix='.csv', sync=True)
+
+
+def validate_paths(paths, workers=VALIDATION_WORKERS, chunk_size=512, progress=None):
+    """Return the subset of paths that exist, checking them in parallel.
+
+    ``os.stat`` releases the GIL, so a thread pool overlaps the filesystem
+    round trips, which matters most on network filesystems. If given,
+    progress(done, total) is called after each chunk.
+    """
+    paths = list(paths)
+    if len(paths) <= chunk_size:
+        found = [path for path in paths if os.path.exists(path)]
+        if progress:
+            progress(len(paths), len(paths))
+        return found
+
+    def existing(chunk):
+        return [path for path in chunk if os.path.exists(path)]
+
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    found = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk, chunk_found in zip(chunks, executor.map(existing, chunks)):
+            found.extend(chunk_found)
+            done += len(chunk)
+            if progress:
+                progress(done, len(paths))
+    return found
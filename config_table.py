@@ -0,0 +1,224 @@
+import bisect
+import tkinter as tk
+import tkinter.ttk as ttk
+
+COLUMNS = ('File Path', 'Revision Directory')
+
+
+class SearchIndex:
+    """Substring search over (file path, revision directory) rows.
+
+    The lowercased rows are joined into one string with a sorted table of row
+    start offsets, so a search is a handful of ``str.find`` calls plus a
+    ``bisect`` per hit instead of lowercasing and scanning every row in Python.
+    The joined text is rebuilt lazily on the first search after a change.
+    """
+
+    SEPARATOR = "\n"
+
+    def __init__(self):
+        self._texts = {}
+        self._haystack = ""
+        self._starts = []
+        self._keys = []
+        self._dirty = False
+
+    def set(self, key, path, revision_dir):
+        self._texts[key] = f"{str(path).lower()}\t{revision_dir.lower()}"
+        self._dirty = True
+
+    def remove(self, key):
+        if self._texts.pop(key, None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        self._texts.clear()
+        self._dirty = True
+
+    def _rebuild(self):
+        starts = []
+        position = 0
+        for text in self._texts.values():
+            starts.append(position)
+            position += len(text) + len(self.SEPARATOR)
+        self._starts = starts
+        self._keys = list(self._texts)
+        self._haystack = self.SEPARATOR.join(self._texts.values())
+        self._dirty = False
+
+    def search(self, term):
+        """Return the set of keys whose path or revision directory contains term."""
+        term = term.lower()
+        if self._dirty:
+            self._rebuild()
+        matches = set()
+        find = self._haystack.find
+        position = find(term)
+        while position != -1:
+            row = bisect.bisect_right(self._starts, position) - 1
+            matches.add(self._keys[row])
+            # Skip to the next row; one hit per row is enough.
+            next_row = row + 1
+            if next_row >= len(self._starts):
+                break
+            position = find(term, self._starts[next_row])
+        return matches
+
+
+class ConfigTable(ttk.Frame):
+    """Treeview that only materializes the rows currently on screen.
+
+    The full list of rows lives in Python; a fixed pool of Treeview items is
+    refilled whenever the view scrolls, so the widget cost does not grow with
+    the number of configured files. Rows can be inserted, updated and deleted
+    one at a time, and filtering goes through a prebuilt SearchIndex.
+    """
+
+    def __init__(self, parent, visible_rows=15, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.rows = {}  # key -> (path, revision_dir), in configuration order
+        self.order = []  # keys currently shown (all rows, or the search results)
+        self.offset = 0
+        self.filter_term = ""
+        self.selected_key = None
+        self.index = SearchIndex()
+        self._visible_keys = []
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show="headings", height=visible_rows,
+                                 selectmode="browse")
+        for column in COLUMNS:
+            self.tree.heading(column, text=column)
+        self.tree.tag_configure('evenrow', background='#f0f0f0')
+        self.tree.tag_configure('oddrow', background='#ffffff')
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self._item_ids = [self.tree.insert("", tk.END, values=("", "")) for _ in range(visible_rows)]
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Configure>", self._on_resize)
+        self.refresh()
+
+    # Data operations
+
+    def set_rows(self, items):
+        """Replace all rows with (key, revision_dir) pairs."""
+        self.rows = {key: (str(key), revision_dir) for key, revision_dir in items}
+        self.index.clear()
+        for key, (path, revision_dir) in self.rows.items():
+            self.index.set(key, path, revision_dir)
+        self._apply_filter()
+
+    def insert(self, key, revision_dir):
+        if key in self.rows:
+            self.update(key, revision_dir)
+            return
+        self.rows[key] = (str(key), revision_dir)
+        self.index.set(key, str(key), revision_dir)
+        term = self.filter_term.lower()
+        if not term or term in str(key).lower() or term in revision_dir.lower():
+            self.order.append(key)
+        self.refresh()
+
+    def update(self, key, revision_dir):
+        self.rows[key] = (str(key), revision_dir)
+        self.index.set(key, str(key), revision_dir)
+        if key in self._visible_keys:
+            self.refresh()
+
+    def delete(self, key):
+        if self.rows.pop(key, None) is None:
+            return
+        self.index.remove(key)
+        try:
+            self.order.remove(key)
+        except ValueError:
+            pass
+        if self.selected_key == key:
+            self.selected_key = None
+        self.refresh()
+
+    def filter(self, term):
+        self.filter_term = term
+        self._apply_filter()
+
+    def _apply_filter(self):
+        if self.filter_term:
+            matches = self.index.search(self.filter_term)
+            self.order = [key for key in self.rows if key in matches]
+        else:
+            self.order = list(self.rows)
+        self.offset = 0
+        self.refresh()
+
+    def selected_row(self):
+        """Return (key, path, revision_dir) of the selected row, or None."""
+        if self.selected_key is None or self.selected_key not in self.rows:
+            return None
+        return (self.selected_key, *self.rows[self.selected_key])
+
+    # View
+
+    def refresh(self):
+        visible = len(self._item_ids)
+        self.offset = max(0, min(self.offset, len(self.order) - visible))
+        self._visible_keys = self.order[self.offset:self.offset + visible]
+        selection = []
+        for position, item_id in enumerate(self._item_ids):
+            if position < len(self._visible_keys):
+                key = self._visible_keys[position]
+                tags = ('evenrow', 'oddrow')[(self.offset + position) % 2]
+                self.tree.item(item_id, values=self.rows[key], tags=tags)
+                if key == self.selected_key:
+                    selection.append(item_id)
+            else:
+                self.tree.item(item_id, values=("", ""), tags=())
+        self.tree.selection_set(selection)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.order)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self.offset / total
+        last = min(1.0, (self.offset + len(self._item_ids)) / total)
+        self.scrollbar.set(first, last)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.order))
+            self.refresh()
+        elif action == "scroll":
+            step = len(self._item_ids) if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        position = self._item_ids.index(selection[0])
+        if position < len(self._visible_keys):
+            self.selected_key = self._visible_keys[position]
+
+    def _on_resize(self, event):
+        # Grow or shrink the item pool to match how many rows fit on screen.
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        row_height = int(row_height) if row_height else 20
+        wanted = max(1, event.height // row_height - 1)
+        while len(self._item_ids) < wanted:
+            self._item_ids.append(self.tree.insert("", tk.END, values=("", "")))
+        while len(self._item_ids) > wanted:
+            self.tree.delete(self._item_ids.pop())
+        self.refresh()
@@ -0,0 +1,118 @@
+import os
+import errno
+import shutil
+import logging
+
+from hashing import CHUNK_SIZE, get_hasher, hash_file
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# ioctl request number for FICLONE (_IOW(0x94, 9, int)): share the source's extents
+# with the destination on copy-on-write filesystems such as btrfs and XFS.
+FICLONE = 0x40049409
+KERNEL_COPY_CHUNK = 64 * 1024 * 1024
+
+# Errors that mean "this kind of copy is not possible here", as opposed to a real I/O error.
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EPERM,
+                       getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+_copy_file_range_supported = hasattr(os, "copy_file_range")
+_sendfile_supported = hasattr(os, "sendfile") and os.name == "posix"
+
+
+def copy_file(source, destination, algorithm=None):
+    """Copy source to destination with its metadata, like ``shutil.copy2``.
+
+    If algorithm is given the content digest is returned, computed during the
+    copy so the source is only read once. The fastest available method is used:
+
+    * a reflink (FICLONE), which shares blocks and writes no data at all;
+    * without a digest to compute, a kernel-side copy (``copy_file_range``,
+      then ``sendfile``) that never moves the data through user space;
+    * otherwise a single read/hash/write pass over one reusable buffer.
+    """
+    cloned = False
+    with open(source, "rb", buffering=0) as src, open(destination, "wb", buffering=0) as dst:
+        if _reflink(src, dst):
+            cloned, digest = True, None
+        elif algorithm:
+            digest = _hashing_copy(src, dst, algorithm)
+        else:
+            digest = None
+            if not _kernel_copy(src, dst):
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    if cloned and algorithm:
+        # Hash the clone, not the source: the source may have changed since it was cloned,
+        # and the digest must describe the bytes actually stored.
+        digest = hash_file(destination, algorithm)
+    shutil.copystat(source, destination)
+    return digest
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+    return True
+
+
+def _kernel_copy(src, dst):
+    """Copy with copy_file_range, else sendfile. Returns False if neither is usable here."""
+    global _copy_file_range_supported, _sendfile_supported
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    if _copy_file_range_supported:
+        try:
+            return _copy_loop(lambda: os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_CHUNK))
+        except _Unsupported as e:
+            _copy_file_range_supported = e.errno != errno.ENOSYS
+            logging.debug(f"copy_file_range not usable for {src.name}: {e}")
+    if _sendfile_supported:
+        try:
+            return _copy_loop(lambda: os.sendfile(dst_fd, src_fd, None, KERNEL_COPY_CHUNK))
+        except _Unsupported as e:
+            _sendfile_supported = e.errno != errno.ENOSYS
+            logging.debug(f"sendfile not usable for {src.name}: {e}")
+    return False
+
+
+class _Unsupported(OSError):
+    pass
+
+
+def _copy_loop(copy_chunk):
+    copied = 0
+    while True:
+        try:
+            sent = copy_chunk()
+        except OSError as e:
+            # Only fall back if nothing was written yet; a failure part way through is a real error.
+            if copied or e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            raise _Unsupported(e.errno, e.strerror) from e
+        if not sent:
+            return True
+        copied += sent
+
+
+def _hashing_copy(src, dst, algorithm, chunk_size=CHUNK_SIZE):
+    hasher = get_hasher(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        size = src.readinto(buffer)
+        if not size:
+            break
+        chunk = view[:size]
+        hasher.update(chunk)
+        written = 0
+        while written < size:
+            written += dst.write(chunk[written:])
+    return hasher.hexdigest()
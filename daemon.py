@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import signal
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from dataclasses import asdict
+from pathlib import Path
+
+from config_store import WATCHERS
+from file_revisioning import FileRevisionManager, normalize_path
+from hashing import DEFAULT_ALGORITHM
+from logging_config import configure_logging
+from replication import DirectoryTarget, ObjectStoreTarget
+from retention import RetentionPolicy
+
+SOCKET_PATH = "file_revision.sock"
+RETENTION_FIELDS = ("keep_last", "horizon", "hourly", "daily", "weekly", "max_total_bytes")
+
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request per line and writes one JSON response per line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.server.revision_daemon.dispatch(request)}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:  # No Unix sockets on this platform
+    ControlServer = None
+
+
+class RevisionDaemon:
+    """Runs a FileRevisionManager headless until SIGTERM/SIGINT.
+
+    SIGHUP reloads the configuration. A local Unix socket accepts JSON
+    commands (``status``, ``add``, ``remove``, ``watcher``, ``reload``,
+    ``revisions``, ``diff``, ``restore``, ``metrics``, ``profile``,
+    ``tracemalloc``) so scripts can drive the daemon without restarting it.
+    """
+
+    def __init__(self, manager, socket_path=SOCKET_PATH):
+        self.manager = manager
+        self.socket_path = socket_path
+        self.server = None
+        self._stop_event = threading.Event()
+        self._reload_requested = threading.Event()
+        self._command_lock = threading.Lock()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_reload_signal)
+
+        self.manager.start_monitoring()
+        self._start_control_server()
+        logging.info(f"Daemon running (pid {os.getpid()})")
+        try:
+            # Wake up regularly so signals are handled promptly on every platform.
+            while not self._stop_event.wait(1):
+                if self._reload_requested.is_set():
+                    self._reload_requested.clear()
+                    self.dispatch({"command": "reload"})
+        finally:
+            self._stop_control_server()
+            self.manager.stop_monitoring()
+            logging.info("Daemon stopped.")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _handle_stop_signal(self, signum, frame):
+        logging.info(f"Received signal {signum}, shutting down")
+        self.stop()
+
+    def _handle_reload_signal(self, signum, frame):
+        # Reloading takes locks, so leave the work to the main loop.
+        self._reload_requested.set()
+
+    def _start_control_server(self):
+        if ControlServer is None:
+            logging.warning("Unix sockets are not available, running without a control socket")
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left behind by a previous run
+        self.server = ControlServer(self.socket_path, ControlRequestHandler)
+        self.server.revision_daemon = self
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self.server.serve_forever, name="ControlServer", daemon=True).start()
+        logging.info(f"Control socket listening on {self.socket_path}")
+
+    def _stop_control_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def dispatch(self, request):
+        command = request.get("command")
+        handler = getattr(self, f"command_{command}", None)
+        if handler is None:
+            raise ValueError(f"Unknown command: {command}")
+        with self._command_lock:
+            return handler(request)
+
+    def command_status(self, request):
+        return {
+            "running": self.manager.is_running(),
+            "files": len(self.manager.FILE_PATHS),
+            "watches": len(self.manager.watches),
+            "polled_files": len(self.manager.polled_paths),
+            "pending_events": self.manager.coalescer.pending_count(),
+            "pending_revisions": self.manager.pipeline.pending_count(),
+            "dropped_events": self.manager.pipeline.dropped,
+            "pending_replication": self.manager.replicator.pending_count() if self.manager.replicator else None,
+        }
+
+    def command_add(self, request):
+        file_path = Path(request["file_path"])
+        if not file_path.exists():
+            raise FileNotFoundError(f"File path does not exist: {file_path}")
+        self.manager.set_file_config(file_path, request["revision_dir"], request.get("watcher"))
+        logging.info(f"File added via control socket: {file_path}")
+        return {"file_path": str(file_path), "revision_dir": request["revision_dir"],
+                "watcher": self.manager.file_watcher(file_path)}
+
+    def command_remove(self, request):
+        key = self.manager.remove_file_config(request["file_path"])
+        if key is None:
+            raise KeyError(f"File is not monitored: {request['file_path']}")
+        logging.info(f"File removed via control socket: {key}")
+        return {"file_path": str(key)}
+
+    def command_watcher(self, request):
+        key = self.manager.set_file_watcher(request["file_path"], request["watcher"])
+        if key is None:
+            raise KeyError(f"File is not monitored: {request['file_path']}")
+        logging.info(f"Watcher of {key} set to {request['watcher']} via control socket")
+        return {"file_path": str(key), "watcher": request["watcher"],
+                "polled": normalize_path(key) in self.manager.polled_paths}
+
+    def command_reload(self, request):
+        self.manager.reload_configuration()
+        return self.command_status(request)
+
+    def command_revisions(self, request):
+        return [asdict(record) for record in self.manager.list_revisions(request["file_path"])]
+
+    def command_metrics(self, request):
+        return self.manager.metrics.render()
+
+    def command_profile(self, request):
+        """Start or stop cProfile capture of the revision path."""
+        if request.get("mode", "start") == "start":
+            self.manager.profiler.start()
+            return "Profiling started.\n"
+        return self.manager.profiler.stop(request.get("output"))
+
+    def command_tracemalloc(self, request):
+        if request.get("mode", "start") == "start":
+            self.manager.allocations.start()
+            return "tracemalloc started.\n"
+        return self.manager.allocations.stop(request.get("output"))
+
+    def command_diff(self, request):
+        return "".join(self.manager.diff_revisions(request["file_path"], request["from_revision"],
+                                                   request.get("to_revision")))
+
+    def command_restore(self, request):
+        self.manager.restore_revision(request["file_path"], request["revision"])
+        return {"file_path": request["file_path"], "revision": request["revision"]}
+
+
+def send_command(command, socket_path=SOCKET_PATH, **arguments):
+    """Send one command to a running daemon and return its result."""
+    # Paths are resolved against the caller's working directory, not the daemon's.
+    for key in ("file_path", "output"):
+        if arguments.get(key):
+            arguments[key] = os.path.abspath(arguments[key])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps({"command": command, **arguments}).encode() + b"\n")
+        with client.makefile("rb") as reader:
+            response = json.loads(reader.readline())
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
+
+
+def retention_settings(args):
+    """(policy, per-file policies) from the command line; (None, None) leaves retention off.
+
+    The per-file policy file is JSON mapping file paths to RetentionPolicy fields,
+    which override the fields given on the command line.
+    """
+    fields = {name: getattr(args, f"retention_{name}") for name in RETENTION_FIELDS}
+    fields = {name: value for name, value in fields.items() if value is not None}
+    file_policies = None
+    if args.retention_file_policies:
+        with open(args.retention_file_policies, "r") as file:
+            file_policies = {os.path.abspath(path): RetentionPolicy(**{**fields, **overrides})
+                             for path, overrides in json.load(file).items()}
+    policy = RetentionPolicy(**fields) if args.retention or fields else None
+    return policy, file_policies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless file revision daemon")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="control socket path")
+    parser.add_argument("--metrics-file", help="write Prometheus metrics to this file (run only)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on localhost:PORT (run only)")
+    parser.add_argument("--replicate-to", help="mirror new revisions into this directory (run only)")
+    parser.add_argument("--replicate-to-object-store",
+                        help="upload new revisions to a local object-store stand-in at this path (run only)")
+    parser.add_argument("--replication-bandwidth", type=int, help="replication bandwidth limit in bytes per second")
+    storage = parser.add_argument_group("storage (run only)")
+    storage.add_argument("--blob-store", metavar="DIR",
+                         help="store revisions as pointers into a content-addressed store in DIR")
+    storage.add_argument("--delta-storage", action="store_true",
+                         help="store revisions as compressed deltas against their predecessor")
+    storage.add_argument("--hash-algorithm", metavar="NAME", default=DEFAULT_ALGORITHM,
+                         help=f"content hash used for duplicate detection (default {DEFAULT_ALGORITHM})")
+    watching = parser.add_argument_group("watching (run only)")
+    watching.add_argument("--poll", metavar="PATH", action="append", default=[],
+                          help="watch files at or under PATH by stat polling (repeatable)")
+    watching.add_argument("--no-auto-polling", dest="auto_polling", action="store_false",
+                          help="do not switch to polling on network, FUSE and overlay filesystems")
+    retention = parser.add_argument_group("retention (run only)")
+    retention.add_argument("--retention", action="store_true", help="prune old revisions (default policy)")
+    retention.add_argument("--retention-keep-last", metavar="N", type=int,
+                           help="always keep the newest N revisions")
+    retention.add_argument("--retention-horizon", metavar="SECONDS", type=float,
+                           help="always keep revisions younger than SECONDS")
+    retention.add_argument("--retention-hourly", metavar="N", type=int,
+                           help="hourly revisions kept beyond the horizon")
+    retention.add_argument("--retention-daily", metavar="N", type=int,
+                           help="daily revisions kept beyond the horizon")
+    retention.add_argument("--retention-weekly", metavar="N", type=int,
+                           help="weekly revisions kept beyond the horizon")
+    retention.add_argument("--retention-max-total-bytes", metavar="BYTES", type=int,
+                           help="size cap per revisions directory")
+    retention.add_argument("--retention-file-policies", metavar="PATH",
+                           help="JSON file of per-file policy overrides")
+    retention.add_argument("--retention-dry-run", action="store_true", help="only log what would be deleted")
+    subparsers = parser.add_subparsers(dest="action")
+    subparsers.add_parser("run", help="run the daemon (default)")
+    subparsers.add_parser("status")
+    subparsers.add_parser("reload")
+    add_parser = subparsers.add_parser("add")
+    add_parser.add_argument("file_path")
+    add_parser.add_argument("revision_dir")
+    add_parser.add_argument("--watcher", choices=WATCHERS,
+                            help="how to watch the file (default: unchanged, auto for a new file)")
+    watcher_parser = subparsers.add_parser("watcher", help="choose how a monitored file is watched")
+    watcher_parser.add_argument("file_path")
+    watcher_parser.add_argument("watcher", choices=WATCHERS)
+    remove_parser = subparsers.add_parser("remove")
+    remove_parser.add_argument("file_path")
+    revisions_parser = subparsers.add_parser("revisions")
+    revisions_parser.add_argument("file_path")
+    diff_parser = subparsers.add_parser("diff", help="diff a revision against the live file or another revision")
+    diff_parser.add_argument("file_path")
+    diff_parser.add_argument("from_revision", type=int)
+    diff_parser.add_argument("to_revision", type=int, nargs="?")
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("file_path")
+    restore_parser.add_argument("revision", type=int)
+    subparsers.add_parser("metrics")
+    for name in ("profile", "tracemalloc"):
+        capture_parser = subparsers.add_parser(name, help=f"start or stop {name} capture of the revision path")
+        capture_parser.add_argument("mode", choices=("start", "stop"))
+        capture_parser.add_argument("--output", help="file to dump the capture to on stop")
+    args = parser.parse_args(argv)
+
+    if args.action in (None, "run"):
+        configure_logging()
+        replication_target = None
+        if args.replicate_to:
+            replication_target = DirectoryTarget(args.replicate_to)
+        elif args.replicate_to_object_store:
+            replication_target = ObjectStoreTarget(args.replicate_to_object_store)
+        retention_policy, retention_file_policies = retention_settings(args)
+        try:
+            manager = FileRevisionManager(blob_store_dir=args.blob_store, delta_storage=args.delta_storage,
+                                          hash_algorithm=args.hash_algorithm,
+                                          polling_paths=args.poll, auto_polling=args.auto_polling,
+                                          metrics_file=args.metrics_file, metrics_port=args.metrics_port,
+                                          replication_target=replication_target,
+                                          replication_bandwidth=args.replication_bandwidth,
+                                          retention_policy=retention_policy,
+                                          retention_file_policies=retention_file_policies,
+                                          retention_dry_run=args.retention_dry_run)
+        except ValueError as e:  # Blob store with delta storage, or an unknown hash algorithm
+            parser.error(str(e))
+        RevisionDaemon(manager, args.socket).run()
+        return 0
+
+    # Only the subcommand's own arguments are sent; parsing no arguments yields exactly the global ones.
+    global_options = vars(parser.parse_args([]))
+    arguments = {key: value for key, value in vars(args).items() if key not in global_options}
+    try:
+        result = send_command(args.action, args.socket, **arguments)
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if isinstance(result, str):
+        sys.stdout.write(result)
+    else:
+        print(json.dumps(result, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+import lzma
+import zlib
+import struct
+from itertools import accumulate
+from pathlib import Path
+
+from atomic_file import write_atomically
+
+DELTA_SUFFIX = ".delta"
+SNAPSHOT_INTERVAL = 20
+BLOCK_SIZE = 2048
+COMPRESSIONS = {
+    "zlib": (b"z", lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (b"x", lzma.compress, lzma.decompress),
+}
+
+MAGIC = b"FRD2"
+# Written before the original size was recorded in the header; still readable.
+LEGACY_MAGIC = b"FRD1"
+KIND_FULL = b"F"
+KIND_DELTA = b"D"
+OP_COPY = b"C"
+OP_LITERAL = b"L"
+COPY_OP = struct.Struct(">QI")
+LITERAL_OP = struct.Struct(">I")
+ORIGINAL_SIZE = struct.Struct(">Q")
+_COMPARE_CHUNK = 64 * 1024
+
+
+def common_prefix_length(a, b, limit):
+    """Length of the common prefix of a and b, comparing large slices before single bytes."""
+    a, b = memoryview(a), memoryview(b)
+    length = 0
+    while length < limit:
+        step = min(_COMPARE_CHUNK, limit - length)
+        if a[length:length + step] == b[length:length + step]:
+            length += step
+            continue
+        # Binary search for the first differing byte inside this chunk.
+        low, high = length, length + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if a[low:middle] == b[low:middle]:
+                low = middle
+            else:
+                high = middle
+        return low
+    return length
+
+
+def common_suffix_length(a, b, limit):
+    """Length of the common suffix of a and b, scanning backwards in large slices."""
+    a, b = memoryview(a), memoryview(b)
+    end_a, end_b = len(a), len(b)
+    length = 0
+    while length < limit:
+        step = min(_COMPARE_CHUNK, limit - length)
+        if a[end_a - length - step:end_a - length] == b[end_b - length - step:end_b - length]:
+            length += step
+            continue
+        # Binary search for the last differing byte inside this chunk.
+        low, high = length, length + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if a[end_a - middle:end_a - low] == b[end_b - middle:end_b - low]:
+                low = middle
+            else:
+                high = middle
+        return low
+    return length
+
+
+def _weak_checksum(block):
+    # sum((len - i) * byte) is the sum of the running prefix sums, which keeps the loop in C.
+    return sum(block) & 0xFFFF, sum(accumulate(block)) & 0xFFFF
+
+
+def compute_delta(base, target, block_size=BLOCK_SIZE, max_literal=None):
+    """Encode target as a list of copy/literal operations against base.
+
+    The common prefix and suffix are matched directly. The region in between
+    is matched rsync-style: base blocks are indexed by a rolling checksum, and
+    the checksum is rolled one byte at a time through the target. Returns None
+    as soon as more than max_literal bytes would have to be stored literally.
+    """
+    if max_literal is None:
+        max_literal = len(target)
+    ops = []
+    limit = min(len(base), len(target))
+    prefix = common_prefix_length(base, target, limit)
+    suffix = common_suffix_length(base, target, limit - prefix)
+    if prefix:
+        ops.append((OP_COPY, 0, prefix))
+
+    base_end = len(base) - suffix
+    target_end = len(target) - suffix
+    blocks = {}
+    for offset in range(prefix, base_end - block_size + 1, block_size):
+        blocks.setdefault(_weak_checksum(base[offset:offset + block_size]), []).append(offset)
+
+    literal_start = position = prefix
+    literal_total = 0
+    checksum = None
+    next_offset = None
+    while blocks and position + block_size <= target_end:
+        # Runs of unchanged blocks usually continue where the last match ended, so
+        # try that first and skip the checksum lookup entirely.
+        if next_offset is not None and next_offset + block_size <= base_end \
+                and base[next_offset:next_offset + block_size] == target[position:position + block_size]:
+            ops.append((OP_COPY, next_offset, block_size))
+            position += block_size
+            literal_start = position
+            next_offset += block_size
+            continue
+        next_offset = None
+
+        if checksum is None:
+            a, b = _weak_checksum(target[position:position + block_size])
+        match = None
+        for offset in blocks.get((a, b), ()):
+            if base[offset:offset + block_size] == target[position:position + block_size]:
+                match = offset
+                break
+
+        if match is not None:
+            if literal_start < position:
+                ops.append((OP_LITERAL, target[literal_start:position]))
+                literal_total += position - literal_start
+            ops.append((OP_COPY, match, block_size))
+            position += block_size
+            literal_start = position
+            next_offset = match + block_size
+            checksum = None
+            continue
+
+        # Roll the checksum forward by one byte.
+        outgoing = target[position]
+        if position + block_size < target_end:
+            incoming = target[position + block_size]
+            a = (a - outgoing + incoming) & 0xFFFF
+            b = (b - block_size * outgoing + a) & 0xFFFF
+            checksum = (a, b)
+        position += 1
+        if literal_total + position - literal_start > max_literal:
+            return None
+
+    if literal_total + target_end - literal_start > max_literal:
+        return None
+    if literal_start < target_end:
+        ops.append((OP_LITERAL, target[literal_start:target_end]))
+    if suffix:
+        ops.append((OP_COPY, base_end, suffix))
+    return _merge_copies(ops)
+
+
+def _merge_copies(ops):
+    merged = []
+    for op in ops:
+        if merged and op[0] == OP_COPY and merged[-1][0] == OP_COPY \
+                and merged[-1][1] + merged[-1][2] == op[1]:
+            merged[-1] = (OP_COPY, merged[-1][1], merged[-1][2] + op[2])
+        else:
+            merged.append(op)
+    return merged
+
+
+def encode_ops(ops):
+    parts = []
+    for op in ops:
+        if op[0] == OP_COPY:
+            parts.append(OP_COPY + COPY_OP.pack(op[1], op[2]))
+        else:
+            parts.append(OP_LITERAL + LITERAL_OP.pack(len(op[1])) + op[1])
+    return b"".join(parts)
+
+
+def apply_delta(base, payload):
+    """Rebuild the target bytes from base and an encoded operation stream."""
+    output = bytearray()
+    view = memoryview(payload)
+    position = 0
+    while position < len(payload):
+        op = payload[position:position + 1]
+        position += 1
+        if op == OP_COPY:
+            offset, length = COPY_OP.unpack_from(view, position)
+            position += COPY_OP.size
+            output += base[offset:offset + length]
+        elif op == OP_LITERAL:
+            (length,) = LITERAL_OP.unpack_from(view, position)
+            position += LITERAL_OP.size
+            output += view[position:position + length]
+            position += length
+        else:
+            raise ValueError(f"Corrupt delta payload: unknown operation {op!r}")
+    return bytes(output)
+
+
+def _read_header(path):
+    with open(path, "rb") as file:
+        fixed = file.read(len(MAGIC) + 4)
+        if fixed[:len(MAGIC)] == MAGIC:
+            (original_size,) = ORIGINAL_SIZE.unpack(file.read(ORIGINAL_SIZE.size))
+            header_length = len(fixed) + ORIGINAL_SIZE.size
+        elif fixed[:len(LEGACY_MAGIC)] == LEGACY_MAGIC:
+            original_size, header_length = None, len(fixed)
+        else:
+            raise ValueError(f"{path} is not a delta revision")
+        kind = fixed[4:5]
+        compression = fixed[5:6]
+        (name_length,) = struct.unpack(">H", fixed[6:8])
+        base_name = file.read(name_length).decode() if name_length else None
+    return kind, compression, base_name, header_length + name_length, original_size
+
+
+def read_header(path):
+    """Return (kind, compression, base_name, header_length) of a stored delta revision."""
+    return _read_header(path)[:4]
+
+
+def original_size(path):
+    """Size of the content a delta revision was saved from, without reconstructing it."""
+    size = _read_header(path)[4]
+    if size is None:
+        # Older revisions do not record it.
+        path = Path(path)
+        size = len(DeltaStore().read_revision(path.parent, path.name))
+    return size
+
+
+class DeltaStore:
+    """Stores revisions as compressed binary deltas against their predecessor.
+
+    A full compressed snapshot is written every ``snapshot_interval`` revisions
+    (and whenever a delta would not be smaller), which bounds how many files
+    have to be read to reconstruct any revision.
+    """
+
+    def __init__(self, snapshot_interval=SNAPSHOT_INTERVAL, compression="zlib", block_size=BLOCK_SIZE):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown delta compression: {compression}")
+        self.snapshot_interval = snapshot_interval
+        self.compression = compression
+        self.block_size = block_size
+
+    def chain_length(self, revisions_dir, name):
+        """Number of deltas between the named revision and its nearest full snapshot."""
+        length = 0
+        kind, _, base_name, _ = read_header(Path(revisions_dir) / name)
+        while kind == KIND_DELTA:
+            length += 1
+            kind, _, base_name, _ = read_header(Path(revisions_dir) / base_name)
+        return length
+
+    def write_revision(self, revisions_dir, name, data, base_name=None):
+        """Store data under name, as a delta against base_name when that keeps chains bounded."""
+        revisions_dir = Path(revisions_dir)
+        tag, compress, _ = COMPRESSIONS[self.compression]
+        payload = compress(data)
+        kind, header_name = KIND_FULL, b""
+
+        if base_name and self.chain_length(revisions_dir, base_name) + 1 < self.snapshot_interval:
+            base = self.read_revision(revisions_dir, base_name)
+            # More literal bytes than the whole compressed snapshot cannot make a smaller delta.
+            ops = compute_delta(base, data, self.block_size, max_literal=len(payload))
+            if ops is not None:
+                delta_payload = compress(encode_ops(ops))
+                if len(delta_payload) < len(payload):
+                    payload, kind, header_name = delta_payload, KIND_DELTA, base_name.encode()
+
+        header = MAGIC + kind + tag + struct.pack(">H", len(header_name)) + ORIGINAL_SIZE.pack(len(data)) + header_name
+
+        def write(tmp_name):
+            with open(tmp_name, "wb") as file:
+                file.write(header)
+                file.write(payload)
+
+        write_atomically(revisions_dir / name, write)
+        return kind == KIND_DELTA
+
+    def read_revision(self, revisions_dir, name):
+        """Reconstruct the original bytes of a stored revision."""
+        revisions_dir = Path(revisions_dir)
+        chain = []
+        while True:
+            path = revisions_dir / name
+            kind, compression, base_name, header_length = read_header(path)
+            with open(path, "rb") as file:
+                file.seek(header_length)
+                payload = self._decompressor(compression)(file.read())
+            if kind == KIND_FULL:
+                data = payload
+                break
+            chain.append(payload)
+            name = base_name
+
+        for payload in reversed(chain):
+            data = apply_delta(data, payload)
+        return data
+
+    @staticmethod
+    def _decompressor(tag):
+        for compression_tag, _, decompress in COMPRESSIONS.values():
+            if compression_tag == tag:
+                return decompress
+        raise ValueError(f"Unknown delta compression tag {tag!r}")
+
+
+def is_delta_revision(path):
+    return Path(path).name.endswith(DELTA_SUFFIX)
@@ -0,0 +1,90 @@
+import time
+import logging
+import threading
+
+QUIET_PERIOD = 0.5
+MAX_DELAY = 5.0
+
+
+class EventCoalescer:
+    """Collapse bursts of events for the same path into a single callback.
+
+    An event is delivered once its path has been quiet for ``quiet_period``
+    seconds, or at the latest ``max_delay`` seconds after the first event of
+    the burst, so a file that is written continuously still gets revisions.
+    Only the most recent event of each burst is passed to the callback.
+    """
+
+    def __init__(self, callback, quiet_period=QUIET_PERIOD, max_delay=MAX_DELAY):
+        self.callback = callback
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self._pending = {}  # key -> [first_seen, last_seen, event]
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="EventCoalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """Stop the worker thread, delivering any pending events first when flush is set."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            pending = [entry[2] for entry in self._pending.values()] if flush else []
+            self._pending.clear()
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+        for event in pending:
+            self._deliver(event)
+
+    def submit(self, key, event):
+        now = time.monotonic()
+        with self._condition:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [now, now, event]
+                self._condition.notify()
+            else:
+                entry[1] = now
+                entry[2] = event
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _due_time(self, entry):
+        first_seen, last_seen, _ = entry
+        return min(last_seen + self.quiet_period, first_seen + self.max_delay)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                due = [key for key, entry in self._pending.items() if self._due_time(entry) <= now]
+                ready = [self._pending.pop(key)[2] for key in due]
+                if not ready:
+                    timeout = None
+                    if self._pending:
+                        timeout = min(self._due_time(entry) for entry in self._pending.values()) - now
+                    self._condition.wait(timeout)
+                    continue
+
+            for event in ready:
+                self._deliver(event)
+
+    def _deliver(self, event):
+        try:
+            self.callback(event)
+        except Exception as e:
+            logging.error(f"Error processing coalesced event for {event.src_path}: {e}")
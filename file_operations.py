@@ -1,16 +1,13 @@
 import csv
 import json
 from pathlib import Path
-from file_revision import FileRevisionManager
 
 # Append file configurations from a CSV file to the current data.
 def import_config_from_csv(filename, current_data):
-    manager = FileRevisionManager()
-
-    with open(filename, 'r') as file:
+    with open(filename, 'r', newline='') as file:
         reader = csv.DictReader(file)
         for row in reader:
-            current_data[row['file_path']] = row['revision_dir']
+            current_data[Path(row['file_path'])] = row['revision_dir']
 
     return current_data
 
@@ -19,7 +16,7 @@ def import_config_from_json(filename, current_data):
     with open(filename, 'r') as file:
         data = json.load(file)
 
-    current_data.update(data)
+    current_data.update((Path(path), revision_dir) for path, revision_dir in data.items())
     return current_data
 
 
@@ -30,10 +27,11 @@ def export_config_to_csv(filename, file_paths):
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
 
-        for path, revision_dir in file_paths.items():
-            writer.writerow({'file_path': path, 'revision_dir': revision_dir})
+        writer.writerows({'file_path': path, 'revision_dir': revision_dir}
+                         for path, revision_dir in file_paths.items())
 
 def export_config_to_json(filename, file_paths):
     """Export file configurations to a JSON file."""
     with open(filename, 'w') as file:
-        json.dump(file_paths, file, indent=4)
+        # JSON object keys must be strings, FILE_PATHS keys are Paths.
+        json.dump({str(path): revision_dir for path, revision_dir in file_paths.items()}, file, indent=4)
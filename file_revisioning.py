@@ -1,147 +1,753 @@
 import os
-import re
-import csv
 import shutil
+import time
 import datetime
 import logging
-import hashlib
+import threading
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-
-# Logging setup
-logging.basicConfig(level=logging.INFO,
-                    format='[%(asctime)s] [%(levelname)s] - %(message)s',
-                    handlers=[logging.FileHandler("file_revision.log"),
-                              logging.StreamHandler()])
+from watchdog.events import FileSystemEventHandler, FileModifiedEvent
+from atomic_file import staged_file
+from revision_store import BlobStore, BLOB_POINTER_SUFFIX, is_blob_pointer
+from hashing import DEFAULT_ALGORITHM, get_hasher, hash_bytes, hash_file
+from revision_index import RevisionManifest, RevisionRecord
+from event_coalescer import EventCoalescer, QUIET_PERIOD, MAX_DELAY
+from revision_pipeline import RevisionPipeline, REVISION_WORKERS, MAX_QUEUED
+from delta import DeltaStore, DELTA_SUFFIX, SNAPSHOT_INTERVAL, is_delta_revision
+from retention import RetentionEngine
+from config_store import ConfigStore, validate_paths
+from copy_engine import copy_file
+from revision_diff import ContentCache, DIFF_CONTEXT, mapped_file, unified_diff
+from metrics import MetricsRegistry, MetricsExporter, ProfileCapture, AllocationCapture
+from stat_cache import StatCache, scan_changed, stat_key
+from polling_watcher import PollingWatcher, needs_polling, read_mounts
+from logging_config import configure_logging
+from replication import Replicator
 
 FILE_PATHS = {}
 LATEST_SUFFIX = "(Latest)"
-FILE_NAME_PATTERN = re.compile(r"(\d+)_" + r"(.+?)_\d{2}-\d{2}-\d{4}")
+
+
+def normalize_path(path):
+    """Canonical string form used to match watchdog event paths against configured files."""
+    return os.path.normcase(os.path.abspath(path))
+
 
 class FileRevisionManager:
-    def __init__(self):
+    def __init__(self, blob_store_dir=None, hash_algorithm=DEFAULT_ALGORITHM,
+                 quiet_period=QUIET_PERIOD, max_delay=MAX_DELAY,
+                 delta_storage=False, snapshot_interval=SNAPSHOT_INTERVAL,
+                 retention_policy=None, retention_dry_run=False, retention_file_policies=None,
+                 auto_reload=True, catch_up=True,
+                 workers=REVISION_WORKERS, max_queued=MAX_QUEUED, overflow="block",
+                 metrics_file=None, metrics_port=None, polling_paths=(), auto_polling=True,
+                 replication_target=None, replication_bandwidth=None):
+        if blob_store_dir and delta_storage:
+            raise ValueError("Blob store and delta storage cannot be combined")
         self.FILE_PATHS = {}
+        self.config_store = ConfigStore()
+        get_hasher(hash_algorithm)  # Fail early on an unknown or unavailable algorithm
+        self.hash_algorithm = hash_algorithm
+        self.manifests = {}
+        self.manifests_lock = threading.Lock()
+        # When a blob store directory is given, revisions are stored as pointers into a
+        # shared content-addressed store instead of as full copies.
+        self.blob_store = BlobStore(blob_store_dir) if blob_store_dir else None
+        # With delta storage each revision is a compressed delta against its predecessor.
+        self.delta_store = DeltaStore(snapshot_interval) if delta_storage else None
+        # Called as listener(file_path, revisions_dir, record) after every new revision.
+        self.revision_listeners = []
+        # Called as listener() after the configuration was reloaded, e.g. after an external edit.
+        self.reload_listeners = []
+        self.watched_paths = {}  # normalized path -> (configured key, Path)
+        self.watches = {}  # directory -> ObservedWatch
+        # Files under polling_paths, or on network/FUSE/overlay filesystems when auto_polling
+        # is set, are watched by stat polling instead, since native events miss changes there.
+        # A watcher chosen for a file in the configuration takes precedence over both.
+        self.polling_paths = [normalize_path(path) for path in polling_paths]
+        self.auto_polling = auto_polling
+        self.file_watchers = {}  # normalized path -> 'polling' or 'native'
+        self.polled_paths = set()
+        self.poller = PollingWatcher(self.queue_file_modification)
         self.observer = Observer()
         self.event_handler = FileModifiedHandler(self)
+        # Bursts of modify events for one file are settled into a single revision.
+        self.coalescer = EventCoalescer(self.queue_revision, quiet_period, max_delay)
+        # Settled events are turned into revisions by a worker pool, one file at a time per file.
+        self.pipeline = RevisionPipeline(self.handle_file_modification, workers, max_queued, overflow)
+        # Changes to the configuration files on disk trigger an incremental reload.
+        self.auto_reload = auto_reload
+        self.config_files = {normalize_path(self.config_store.config_file),
+                             normalize_path(self.config_store.journal_file)}
+        self.config_coalescer = EventCoalescer(lambda event: self.reload_changed_configuration(),
+                                               quiet_period, max_delay)
+        # Held while monitoring is started, stopped or reloaded; the GUI, the daemon and
+        # the configuration watcher can all ask for these at the same time.
+        self.monitor_lock = threading.RLock()
+        # Old revisions are pruned in the background when a retention policy is given, for
+        # all files or per file (retention_file_policies maps file paths to policies).
+        self.retention = RetentionEngine(self, retention_policy, retention_file_policies,
+                                         dry_run=retention_dry_run) \
+            if retention_policy or retention_file_policies else None
+        # Files changed while monitoring was stopped are found at start by comparing
+        # their stat against the one recorded at their last revision.
+        self.catch_up = catch_up
+        self.stat_cache = StatCache()
+        # Reconstructed delta revisions, kept while they are being browsed and diffed.
+        self.content_cache = ContentCache()
+        # normalized path -> (digest, record) written by restore_revision, so the watcher
+        # event it causes does not record the restored content again.
+        self.restored_digests = {}
+        # New revisions are copied to a secondary target in the background when one is given.
+        self.replicator = Replicator(self, replication_target, bandwidth=replication_bandwidth) \
+            if replication_target is not None else None
+        if self.replicator:
+            self.revision_listeners.append(self.replicator.on_revision)
+        self.init_metrics(metrics_file, metrics_port)
         self.running = False
 
-    def load_config(self):
+    def init_metrics(self, metrics_file, metrics_port):
+        self.metrics = MetricsRegistry()
+        self.stage_seconds = self.metrics.histogram(
+            "stage_seconds", "Time spent in each stage of creating a revision.", label="stage")
+        self.events_seen = self.metrics.counter("events_total", "Modify events received for monitored files.")
+        self.revisions_created = self.metrics.counter("revisions_total", "Revisions created.")
+        self.duplicates_skipped = self.metrics.counter("duplicates_total", "Events skipped as duplicate content.")
+        self.bytes_hashed = self.metrics.counter("hashed_bytes_total", "Bytes read to compute checksums.")
+        self.bytes_copied = self.metrics.counter("copied_bytes_total", "Bytes written to revision storage.")
+        self.errors = self.metrics.counter("errors_total", "Events that failed with an error.")
+        self.metrics.gauge("watches", "Directory watches scheduled.", lambda: len(self.watches))
+        self.metrics.gauge("polled_files", "Files watched by stat polling.", lambda: len(self.polled_paths))
+        self.metrics.gauge("monitored_files", "Files in the configuration.", lambda: len(self.FILE_PATHS))
+        self.metrics.gauge("settling_events", "Events waiting for their file to settle.",
+                           self.coalescer.pending_count)
+        self.metrics.gauge("queued_revisions", "Revisions queued or in progress.", self.pipeline.pending_count)
+        self.metrics.gauge("dropped_events", "Events dropped because the revision queue was full.",
+                           lambda: self.pipeline.dropped)
+        self.metrics.gauge("content_cache_bytes", "Size of the reconstructed-revision cache.",
+                           lambda: self.content_cache.size)
+        if self.replicator:
+            self.metrics.gauge("replication_pending", "Revisions not yet stored on the replication target.",
+                               self.replicator.pending_count)
+            self.metrics.gauge("replicated_revisions", "Revisions replicated since start.",
+                               lambda: self.replicator.replicated)
+        self.event_received = {}  # normalized path -> perf_counter() of the first unhandled event
+        self.metrics_exporter = MetricsExporter(self.metrics, metrics_file, metrics_port) \
+            if metrics_file or metrics_port is not None else None
+        # Runtime-switchable cProfile and tracemalloc capture of the revision path.
+        self.profiler = ProfileCapture()
+        self.allocations = AllocationCapture()
+
+    def load_config(self, progress=None):
+        """Read and validate the configuration. progress(done, total) is called as paths are checked."""
         new_file_paths = {}
-        config_file = 'file_config.csv'
-
-        # Check if config file exists, if not create it.
-        if not os.path.exists(config_file):
-            logging.warning(f"{config_file} not found, creating...")
-            with open(config_file, mode='w', newline='') as file:
-                fieldnames = ['file_path', 'revision_dir']
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
 
         try:
-            with open(config_file, mode='r') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    file_path = Path(row['file_path'])
-
-                    if not file_path.exists():
-                        logging.warning(f"File path does not exist: {file_path}")
-                        continue
-
-                    if not file_path.parent.exists():
-                        logging.warning(f"Directory for file does not exist: {file_path.parent}")
-                        continue
-
-                    new_file_paths[file_path] = row['revision_dir']
+            entries = self.config_store.load()
+            # Existence checks run in parallel; a large configuration is mostly stat latency.
+            existing = set(validate_paths(entries, progress=progress))
+            for file_path, revision_dir in entries.items():
+                if file_path not in existing:
+                    logging.warning(f"File path does not exist: {file_path}")
+                    continue
+
+                new_file_paths[Path(file_path)] = revision_dir
+            self.file_watchers = {normalize_path(file_path): watcher
+                                  for file_path, watcher in self.config_store.watchers.items()}
             logging.info(f"Loaded configuration")
 
         except Exception as e:
-            logging.error(f"Error reading CSV file: {e}")
+            # A transient read error must not unschedule every watch.
+            logging.error(f"Error reading CSV file, keeping the current configuration: {e}")
+            return dict(self.FILE_PATHS)
 
         return new_file_paths
 
+    def set_file_config(self, file_path, revision_dir, watcher=None):
+        """Add or update one monitored file; only a journal entry is written and one watch added.
+
+        watcher ('auto', 'polling' or 'native') is left unchanged when None.
+        """
+        with self.monitor_lock:
+            key = self.find_configured_path(file_path) or Path(file_path)
+            self.FILE_PATHS[key] = revision_dir
+            self.config_store.set(key, revision_dir)
+            if watcher is not None:
+                self.set_file_watcher(key, watcher)
+            else:
+                self.watch_file(key)
+        return key
+
+    def set_file_watcher(self, file_path, watcher):
+        """Choose how a monitored file is watched and move its watch accordingly."""
+        with self.monitor_lock:
+            key = self.find_configured_path(file_path)
+            if key is None:
+                return None
+            self.config_store.set_watcher(key, watcher)
+            normalized = normalize_path(key)
+            if watcher == 'auto':
+                self.file_watchers.pop(normalized, None)
+            else:
+                self.file_watchers[normalized] = watcher
+            self.unwatch_file(key)
+            self.watch_file(key)
+        return key
+
+    def file_watcher(self, file_path):
+        """The watcher configured for file_path: 'auto', 'polling' or 'native'."""
+        return self.file_watchers.get(normalize_path(file_path), 'auto')
+
+    def remove_file_config(self, file_path):
+        with self.monitor_lock:
+            key = self.find_configured_path(file_path)
+            if key is None:
+                return None
+            del self.FILE_PATHS[key]
+            self.config_store.delete(key)
+            self.unwatch_file(key)
+            self.file_watchers.pop(normalize_path(key), None)
+        return key
+
+    def import_config(self, entries):
+        """Add a batch of (file_path, revision_dir) pairs with a single configuration write."""
+        entries = [(Path(file_path), revision_dir) for file_path, revision_dir in entries]
+        with self.monitor_lock:
+            self.FILE_PATHS.update(entries)
+            self.config_store.update(entries)
+            self.watch_files([key for key, _ in entries])
+
+    def find_configured_path(self, file_path):
+        """Return the FILE_PATHS key for file_path, however it was spelled, or None."""
+        normalized = normalize_path(file_path)
+        watched = self.watched_paths.get(normalized)
+        if watched is not None:
+            return watched[0]
+        for key in self.FILE_PATHS:
+            if normalize_path(key) == normalized:
+                return key
+        return None
+
+    def revisions_dir_for(self, key):
+        """Revisions directory of a configured file, spelled the way the watcher spells it."""
+        return Path(normalize_path(key)).parent / self.FILE_PATHS[key]
+
+    def list_revisions(self, file_path):
+        """Revision records of a monitored file, oldest first."""
+        key = self.find_configured_path(file_path)
+        if key is None:
+            raise KeyError(f"File is not monitored: {file_path}")
+        revisions_dir = self.revisions_dir_for(key)
+        if not revisions_dir.exists():
+            return []
+        return self.get_manifest(revisions_dir).revisions_of(Path(normalize_path(key)).name)
+
+    def find_revision(self, file_path, revision):
+        """Return (live file path, revisions dir, record) for a revision given by counter or name."""
+        for record in self.list_revisions(file_path):
+            if revision in (record.counter, record.name):
+                key = self.find_configured_path(file_path)
+                return Path(normalize_path(key)), self.revisions_dir_for(key), record
+        raise KeyError(f"No revision {revision} of {file_path}")
+
+    @contextmanager
+    def open_revision(self, revisions_dir, name):
+        """Yield the content of a revision as a read-only buffer.
+
+        Full copies and blobs are memory-mapped; delta revisions are reconstructed
+        once and then served from the content cache.
+        """
+        revision_path = revisions_dir / name
+        if is_delta_revision(revision_path):
+            cache_key = (str(revisions_dir), name)
+            data = self.content_cache.get(cache_key)
+            if data is None:
+                data = self.read_revision(revisions_dir, name)
+                self.content_cache.put(cache_key, data)
+            yield data
+            return
+        if is_blob_pointer(revision_path):
+            revision_path = self.blob_path_for(revision_path)
+        with mapped_file(revision_path) as data:
+            yield data
+
+    def get_revision_content(self, file_path, revision):
+        _, revisions_dir, record = self.find_revision(file_path, revision)
+        with self.open_revision(revisions_dir, record.name) as data:
+            return data[:]
+
+    def diff_revisions(self, file_path, from_revision, to_revision=None, context=DIFF_CONTEXT):
+        """Yield unified diff lines between two revisions, or a revision and the live file."""
+        live_path, revisions_dir, old = self.find_revision(file_path, from_revision)
+        with ExitStack() as stack:
+            a = stack.enter_context(self.open_revision(revisions_dir, old.name))
+            if to_revision is None:
+                # The live file can be truncated while we read it, which would crash a mapping.
+                b, to_label = live_path.read_bytes(), str(live_path)
+            else:
+                _, _, new = self.find_revision(file_path, to_revision)
+                b, to_label = stack.enter_context(self.open_revision(revisions_dir, new.name)), new.name
+            yield from unified_diff(a, b, old.name, to_label, context)
+
+    def restore_revision(self, file_path, revision):
+        """Atomically replace the live file with the content of a revision.
+
+        The current content is recorded as a revision first (unless it already is
+        one), so a restore never loses work; if that fails, nothing is restored.
+        """
+        live_path, revisions_dir, record = self.find_revision(file_path, revision)
+        normalized = str(live_path)
+        if live_path.exists():
+            if self.save_revision(self.find_configured_path(file_path), live_path) is None:
+                raise RuntimeError(f"Could not save the current content of {live_path}, not restoring")
+
+        with staged_file(live_path.parent) as tmp_name:
+            revision_path = revisions_dir / record.name
+            if is_delta_revision(revision_path):
+                with self.open_revision(revisions_dir, record.name) as data:
+                    Path(tmp_name).write_bytes(data)
+            else:
+                if is_blob_pointer(revision_path):
+                    revision_path = self.blob_path_for(revision_path)
+                copy_file(revision_path, tmp_name)
+            # The restored file keeps the live file's permissions and gets a fresh mtime.
+            if live_path.exists():
+                shutil.copymode(live_path, tmp_name)
+            os.utime(tmp_name)
+            digest = record.digest if record.algorithm == self.hash_algorithm else hash_file(tmp_name, self.hash_algorithm)
+            if self.running:
+                self.restored_digests[normalized] = (digest, record)
+            os.replace(tmp_name, live_path)
+        self.stat_cache.record(normalized, stat_key(live_path.stat()))
+        logging.info(f"Restored {live_path} from revision {record.name}")
+
     def initialize_revisions_directory(self, file_path, revisions_dir_name):
-        print(f"Function received: {file_path}, {revisions_dir_name}")
+        logging.debug(f"Initializing revisions directory {revisions_dir_name} for {file_path}")
         try:
             revisions_dir = file_path.parent / revisions_dir_name
-            if not revisions_dir.exists():
-                revisions_dir.mkdir()
+            revisions_dir.mkdir(exist_ok=True)
             return revisions_dir
         except Exception as e:
             logging.error(f"Error initializing revisions directory for {file_path}: {e}")
             return None
 
+    def get_manifest(self, revisions_dir):
+        # Workers share one manifest (and its lock) per directory, so creating it must not race.
+        with self.manifests_lock:
+            if revisions_dir not in self.manifests:
+                self.manifests[revisions_dir] = RevisionManifest(revisions_dir, self.blob_store)
+            return self.manifests[revisions_dir]
+
+    def read_revision(self, revisions_dir, name):
+        """Return the original bytes of a stored revision, whatever form it is stored in."""
+        revision_path = revisions_dir / name
+        if is_blob_pointer(revision_path):
+            return self.blob_path_for(revision_path).read_bytes()
+        if is_delta_revision(revision_path):
+            return (self.delta_store or DeltaStore()).read_revision(revisions_dir, name)
+        return revision_path.read_bytes()
+
+    def blob_path_for(self, pointer_path):
+        """Path of the blob a pointer revision refers to."""
+        if self.blob_store is None:
+            raise ValueError(f"{pointer_path.name} is stored in a blob store that is not configured")
+        return self.blob_store.blob_path(*BlobStore.read_pointer(pointer_path))
+
+    def get_revision_checksum(self, revisions_dir, record, manifest):
+        """Digest of a stored revision, taken from the manifest whenever it is already known."""
+        if record.digest and record.algorithm == self.hash_algorithm:
+            return record.digest
+
+        revision_path = revisions_dir / record.name
+        if is_blob_pointer(revision_path):
+            algorithm, digest = BlobStore.read_pointer(revision_path)
+            if algorithm != self.hash_algorithm:
+                if self.blob_store is None:
+                    return None
+                digest = hash_file(self.blob_store.blob_path(algorithm, digest), self.hash_algorithm)
+        elif is_delta_revision(revision_path):
+            digest = hash_bytes(self.read_revision(revisions_dir, record.name), self.hash_algorithm)
+        else:
+            # Revisions recovered from filenames (or made with another algorithm) are hashed once.
+            digest = hash_file(revision_path, self.hash_algorithm)
+        manifest.set_digest(record.counter, self.hash_algorithm, digest)
+        return digest
+
+    def build_watch_table(self):
+        """Index the configured files by normalized path and return the set of directories to watch."""
+        watched_paths = {}
+        watch_dirs = set()
+        for file_path in self.FILE_PATHS:
+            normalized = normalize_path(file_path)
+            watched_paths[normalized] = (file_path, Path(normalized))
+            watch_dirs.add(os.path.dirname(normalized))
+        self.watched_paths = watched_paths
+        return watch_dirs
+
     def handle_file_modification(self, event):
+        started = time.perf_counter()
         try:
-            modified_path = Path(event.src_path)
-            if modified_path in self.FILE_PATHS.keys():
-                revisions_dir_name = self.FILE_PATHS[modified_path]
-                revisions_dir = self.initialize_revisions_directory(modified_path, revisions_dir_name)
-
-                if revisions_dir is None:
-                    return
-
-                with open(modified_path, "rb") as file:
-                    file_contents = file.read()
-                    md5_checksum = hashlib.md5(file_contents).hexdigest()
-
-                revision_date = datetime.datetime.now().strftime('%d-%m-%Y')
-                revision_counter = 1
-                last_file_md5 = None
-
-                for existing_file in sorted(revisions_dir.iterdir(), reverse=True):  # Start from the most recent
-                    match = FILE_NAME_PATTERN.search(existing_file.name)
-                    if match:
-                        last_file_md5 = hashlib.md5(existing_file.read_bytes()).hexdigest()
-                        revision_counter = int(match.group(1)) + 1
-                        break
-
-                if md5_checksum == last_file_md5:
-                    logging.info(f"Duplicate file detected, not creating a new revision for {modified_path}")
-                    return
-
-                new_revision_name = f"{str(revision_counter).zfill(3)}_{modified_path.stem}_{revision_date}{modified_path.suffix}"
-                shutil.copy2(modified_path, revisions_dir / new_revision_name)
-                logging.info(f"New revision created: {new_revision_name}")
-
+            self.profiler.call(self.create_revision, event)
         except Exception as e:
+            self.errors.inc()
             logging.error(f"Error handling file modification for {event.src_path}: {e}")
-
-    def start_monitoring(self):
-        if not self.running:
-            self.FILE_PATHS = self.load_config()
-            if not self.observer:
-                self.observer = Observer()
-            try:
-                for file_path in self.FILE_PATHS.keys():
-                    self.observer.schedule(self.event_handler, path=str(file_path.parent), recursive=False)
-                self.observer.start()
-                self.running = True
-                logging.info("Observer started.")
-            except Exception as e:
-                logging.error(f"Error during monitoring: {e}")
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, "total")
+
+    def create_revision(self, event):
+        normalized = os.path.normcase(event.src_path)
+        received = self.event_received.pop(normalized, None)
+        if received is not None:
+            self.stage_seconds.observe(time.perf_counter() - received, "queue")
+        watched = self.watched_paths.get(normalized)
+        if watched is None:
+            return None
+        return self.save_revision(*watched)
+
+    def save_revision(self, key, modified_path):
+        """Store the current content of a configured file as a new revision.
+
+        Returns the new record, or the existing one when the content is already
+        stored; None if the file is not configured or has no revisions directory.
+        """
+        normalized = str(modified_path)
+        record = None
+        revisions_dir_name = self.FILE_PATHS.get(key)
+        if revisions_dir_name is not None:
+            with self.stage_seconds.time("directory"):
+                revisions_dir = self.initialize_revisions_directory(modified_path, revisions_dir_name)
+                if revisions_dir is None:
+                    return None
+                manifest = self.get_manifest(revisions_dir)
+
+            # Taken before reading, so a change made during the copy shows up at the next catch-up.
+            stat = modified_path.stat()
+            with ExitStack() as stages:
+                if not self.delta_store:
+                    with manifest.lock:
+                        latest = manifest.latest(modified_path.name)
+                        last_checksum = self.get_revision_checksum(revisions_dir, latest, manifest) \
+                            if latest and latest.size == stat.st_size else None
+                    if last_checksum is not None:
+                        # A file saved without changes keeps its size. Settle that case with one
+                        # read instead of a copy that would only be thrown away.
+                        with self.stage_seconds.time("hash"):
+                            checksum = hash_file(modified_path, self.hash_algorithm)
+                        self.bytes_hashed.inc(stat.st_size)
+                        if checksum == last_checksum:
+                            self.restored_digests.pop(normalized, None)
+                            self.skip_duplicate(normalized, stat, f"Duplicate file detected, not creating a new revision for {modified_path}")
+                            return latest
+
+                if self.blob_store:
+                    # Blobs are hashed while they are copied into the store and named by that
+                    # digest, so a blob always matches its name even if the file changes meanwhile.
+                    with self.stage_seconds.time("copy"):
+                        checksum, new_blob = self.blob_store.store(modified_path, self.hash_algorithm)
+                    size = os.path.getsize(self.blob_store.blob_path(self.hash_algorithm, checksum))
+                    self.bytes_hashed.inc(size)
+                    if new_blob:
+                        self.bytes_copied.inc(size)
+                elif self.delta_store:
+                    # Read once: the digest and the stored delta describe the same bytes.
+                    data = modified_path.read_bytes()
+                    size = len(data)
+                    with self.stage_seconds.time("hash"):
+                        checksum = hash_bytes(data, self.hash_algorithm)
+                    self.bytes_hashed.inc(size)
+                else:
+                    # Full copies are hashed while they are staged next to the revisions, so the
+                    # file is read only once; the stage is then renamed into place or discarded.
+                    with self.stage_seconds.time("copy"):
+                        # Staging bumps the directory mtime; touch the manifest once the stage is gone.
+                        stages.callback(manifest.touch)
+                        staged_path = stages.enter_context(staged_file(revisions_dir))
+                        checksum = copy_file(modified_path, staged_path, self.hash_algorithm)
+                    size = os.path.getsize(staged_path)
+                    self.bytes_hashed.inc(size)
+                    self.bytes_copied.inc(size)
+
+                with manifest.lock:
+                    with self.stage_seconds.time("duplicate_check"):
+                        revision_date = datetime.datetime.now().strftime('%d-%m-%Y')
+                        revision_counter = manifest.next_counter()
+                        latest = manifest.latest(modified_path.name)
+                        last_checksum = self.get_revision_checksum(revisions_dir, latest, manifest) if latest else None
+
+                    restored_digest, restored_record = self.restored_digests.pop(normalized, (None, None))
+                    if restored_digest == checksum:
+                        self.skip_duplicate(normalized, stat, f"Restored content of {modified_path} is already a revision, not creating a new one")
+                        return restored_record
+
+                    if checksum == last_checksum:
+                        self.skip_duplicate(normalized, stat, f"Duplicate file detected, not creating a new revision for {modified_path}")
+                        return latest
+
+                    new_revision_name = f"{str(revision_counter).zfill(3)}_{modified_path.stem}_{revision_date}{modified_path.suffix}"
+                    if self.blob_store:
+                        new_revision_name += BLOB_POINTER_SUFFIX
+                        BlobStore.write_pointer(revisions_dir / new_revision_name, self.hash_algorithm, checksum)
+                    elif self.delta_store:
+                        new_revision_name += DELTA_SUFFIX
+                        base_name = latest.name if latest and is_delta_revision(latest.name) else None
+                        manifest.reserve(revision_counter)
+                    else:
+                        os.replace(staged_path, revisions_dir / new_revision_name)
+                    if not self.delta_store:
+                        record = self.add_revision(manifest, normalized, stat, revision_counter,
+                                                   new_revision_name, size, checksum)
+
+                if self.delta_store:
+                    # Building a delta reconstructs its base and scans the content, which can take
+                    # seconds. The reserved counter lets other saves into this directory, retention
+                    # and restores go ahead meanwhile; the base stays the file's latest revision.
+                    try:
+                        with self.stage_seconds.time("copy"):
+                            self.delta_store.write_revision(revisions_dir, new_revision_name, data, base_name)
+                    except BaseException:
+                        with manifest.lock:
+                            manifest.release(revision_counter)
+                            manifest.touch()
+                        raise
+                    self.bytes_copied.inc(os.path.getsize(revisions_dir / new_revision_name))
+                    with manifest.lock:
+                        record = self.add_revision(manifest, normalized, stat, revision_counter,
+                                                   new_revision_name, size, checksum)
+
+            for listener in self.revision_listeners:
+                listener(modified_path, revisions_dir, record)
+        return record
+
+    def add_revision(self, manifest, normalized, stat, counter, name, size, checksum):
+        """Record a revision whose file is in place; called with manifest.lock held."""
+        record = RevisionRecord(counter, name, time.time(), size, self.hash_algorithm, checksum)
+        manifest.add(record)
+        self.stat_cache.record(normalized, stat_key(stat))
+        self.revisions_created.inc()
+        logging.info(f"New revision created: {name}")
+        return record
+
+    def skip_duplicate(self, normalized, stat, message):
+        self.stat_cache.record(normalized, stat_key(stat))
+        self.duplicates_skipped.inc()
+        logging.info(message)
+
+    def queue_file_modification(self, event):
+        # Most events in a watched directory are for files we do not track; drop them
+        # with a single dictionary lookup before doing any other work.
+        if event.is_directory:
+            return
+        normalized = os.path.normcase(event.src_path)
+        if normalized in self.watched_paths:
+            self.events_seen.inc()
+            self.event_received.setdefault(normalized, time.perf_counter())
+            self.coalescer.submit(event.src_path, event)
+        if self.auto_reload and normalized in self.config_files:
+            self.config_coalescer.submit(normalized, event)
+
+    def queue_revision(self, event):
+        self.pipeline.submit(os.path.normcase(event.src_path), event)
+
+    def forced_polling(self, normalized):
+        """True if normalized is one of, or lies under one of, the configured polling_paths."""
+        return any(normalized == prefix or normalized.startswith(prefix.rstrip(os.sep) + os.sep)
+                   for prefix in self.polling_paths)
+
+    def watcher_for(self, normalized):
+        """'polling' or 'native' when chosen for the file, else 'auto' (decided by its filesystem)."""
+        watcher = self.file_watchers.get(normalized)
+        if watcher is not None:
+            return watcher
+        return 'polling' if self.forced_polling(normalized) else 'auto'
+
+    def uses_polling(self, normalized, mounts, polled_dirs):
+        """True if the file is to be watched by stat polling.
+
+        mounts is the mount table read once by the caller; polled_dirs caches the
+        filesystem check per directory across one batch of files.
+        """
+        watcher = self.watcher_for(normalized)
+        if watcher != 'auto':
+            return watcher == 'polling'
+        directory = os.path.dirname(normalized)
+        if directory not in polled_dirs:
+            polled_dirs[directory] = self.auto_polling and needs_polling(directory, mounts)
+        return polled_dirs[directory]
+
+    def watch_directories(self):
+        """Rebuild the watch table, hand polled files to the poller and return the directories to watch."""
+        self.build_watch_table()
+        mounts = read_mounts() if self.auto_polling else None
+        directories, polled, polled_dirs = set(), set(), {}
+        for normalized in self.watched_paths:
+            if self.uses_polling(normalized, mounts, polled_dirs):
+                polled.add(normalized)
+            else:
+                directories.add(os.path.dirname(normalized))
+        self.poller.set_paths(polled)
+        self.polled_paths = polled
+        if self.auto_reload:
+            directories.add(os.path.dirname(normalize_path(self.config_store.config_file)))
+        return directories
+
+    def watch_file(self, key):
+        """Start watching one configured file without rebuilding the watch table."""
+        self.watch_files([key])
+
+    def watch_files(self, keys):
+        """Start watching configured files, reading the mount table and updating the poller once."""
+        mounts = read_mounts() if self.auto_polling else None
+        polled_dirs, polled = {}, False
+        for key in keys:
+            normalized = normalize_path(key)
+            self.watched_paths[normalized] = (key, Path(normalized))
+            directory = os.path.dirname(normalized)
+            if self.uses_polling(normalized, mounts, polled_dirs):
+                self.polled_paths.add(normalized)
+                polled = True
+            elif self.running and directory not in self.watches:
+                self.watches[directory] = self.observer.schedule(self.event_handler, path=directory, recursive=False)
+        if polled:
+            self.poller.set_paths(self.polled_paths)
+
+    def unwatch_file(self, key):
+        """Stop watching one file, dropping its directory watch if no other file needs it."""
+        normalized = normalize_path(key)
+        self.watched_paths.pop(normalized, None)
+        if normalized in self.polled_paths:
+            self.polled_paths.discard(normalized)
+            self.poller.set_paths(self.polled_paths)
+            return
+        directory = os.path.dirname(normalized)
+        if directory not in self.watches:
+            return
+        if self.auto_reload and directory == os.path.dirname(normalize_path(self.config_store.config_file)):
+            return
+        if not any(os.path.dirname(path) == directory for path in self.watched_paths if path not in self.polled_paths):
+            self.observer.unschedule(self.watches.pop(directory))
+
+    def update_watches(self, directories):
+        """Schedule and unschedule watches on the live observer so exactly directories are watched.
+
+        Returns (added, removed) counts. Directories present before and after keep
+        their existing watch, so their files are monitored without interruption.
+        """
+        removed = [directory for directory in self.watches if directory not in directories]
+        added = [directory for directory in directories if directory not in self.watches]
+        for directory in removed:
+            self.observer.unschedule(self.watches.pop(directory))
+        for directory in added:
+            self.watches[directory] = self.observer.schedule(self.event_handler, path=directory, recursive=False)
+        return len(added), len(removed)
+
+    def start_monitoring(self, load=True):
+        """Start watching. With load=False the FILE_PATHS already loaded are used as is."""
+        with self.monitor_lock:
+            if not self.running:
+                if load:
+                    self.FILE_PATHS = self.load_config()
+                if not self.observer:
+                    self.observer = Observer()
+                try:
+                    if self.catch_up and not self.stat_cache.loaded:
+                        self.stat_cache.load()
+                    # One watch per directory, however many monitored files it contains.
+                    self.update_watches(self.watch_directories())
+                    self.pipeline.start()
+                    self.coalescer.start()
+                    self.config_coalescer.start()
+                    self.observer.start()
+                    self.poller.start()
+                    if self.retention:
+                        self.retention.start()
+                    if self.replicator:
+                        self.replicator.start()
+                    if self.metrics_exporter:
+                        self.metrics_exporter.start()
+                    self.running = True
+                    logging.info("Observer started.")
+                    if self.catch_up:
+                        self.catch_up_changes()
+                except Exception as e:
+                    logging.error(f"Error during monitoring: {e}")
 
     def stop_monitoring(self):
-        if self.running:
-            if self.observer:
-                self.observer.stop()
-                self.observer.join()  # Ensure all threads are finished
-                self.observer = None
-            self.running = False
-            logging.info("Observer stopped.")
+        # Outside the lock: the configuration watcher's thread may be waiting for it to reload.
+        self.config_coalescer.stop(flush=False)
+        with self.monitor_lock:
+            if self.running:
+                if self.observer:
+                    self.observer.stop()
+                    self.observer.join()  # Ensure all threads are finished
+                    self.observer = None
+                self.watches.clear()
+                self.poller.stop()
+                if self.retention:
+                    self.retention.stop()
+                self.coalescer.stop()  # Write out revisions for any events still settling
+                self.pipeline.stop()  # and wait until every queued revision is written
+                if self.replicator:
+                    self.replicator.stop()
+                if self.metrics_exporter:
+                    self.metrics_exporter.stop()
+                if self.catch_up:
+                    try:
+                        self.stat_cache.save(self.watched_paths)
+                    except Exception as e:
+                        logging.error(f"Error saving stat cache: {e}")
+                self.running = False
+                logging.info("Observer stopped.")
+
+    def catch_up_changes(self):
+        """Queue a revision for every monitored file that changed while monitoring was stopped."""
+        started = time.perf_counter()
+        changed, unknown = scan_changed(self.watched_paths, self.stat_cache)
+
+        # Files seen for the first time are only queued when they are newer than their
+        # latest revision; otherwise their current stat becomes the baseline.
+        for path, key in unknown:
+            config_key, file_path = self.watched_paths[path]
+            revisions_dir = file_path.parent / self.FILE_PATHS[config_key]
+            latest = self.get_manifest(revisions_dir).latest(file_path.name) if revisions_dir.exists() else None
+            if latest is not None and key[2] > latest.timestamp * 1e9:
+                changed.append((path, key))
+            else:
+                self.stat_cache.record(path, key)
+
+        for path, key in changed:
+            self.coalescer.submit(path, FileModifiedEvent(path))
+        logging.info(f"Catch-up scan queued {len(changed)} of {len(self.watched_paths)} files "
+                     f"in {time.perf_counter() - started:.2f}s")
 
     def is_running(self):
         return self.running
 
+    def reload_changed_configuration(self):
+        """Reload after the configuration files changed, unless the change was this process's own edit."""
+        if self.config_store.changed_on_disk():
+            self.reload_configuration()
+        else:
+            logging.debug("Configuration files only changed by our own edits, not reloading")
+
     def reload_configuration(self):
-        # 1. Stop the current observer.
-        self.stop_monitoring()
+        with self.monitor_lock:
+            # 1. Load the new configuration.
+            self.FILE_PATHS = self.load_config()
 
-        # 2. Load the new configuration.
-        self.FILE_PATHS = self.load_config()
+            if not self.running:
+                self.build_watch_table()
+            else:
+                # 2. Only schedule/unschedule the directories whose watch set changed; the
+                # observer keeps running so no event is lost during the reload.
+                try:
+                    added, removed = self.update_watches(self.watch_directories())
+                    logging.info(f"Configuration reloaded: {added} watches added, {removed} removed.")
+                except Exception as e:
+                    logging.error(f"Error updating watches during reload: {e}")
 
-        # 3. Restart the observer with the updated configuration.
-        self.start_monitoring()
+        for listener in self.reload_listeners:
+            listener()
 
 
 class FileModifiedHandler(FileSystemEventHandler):
@@ -150,15 +756,22 @@ class FileModifiedHandler(FileSystemEventHandler):
         self.manager = manager
 
     def on_modified(self, event):
-        self.manager.handle_file_modification(event)
+        self.manager.queue_file_modification(event)
+
+    def on_moved(self, event):
+        # Atomic saves (write a temporary file, rename over the target) arrive as moves.
+        if not event.is_directory:
+            self.manager.queue_file_modification(FileModifiedEvent(event.dest_path))
 
 if __name__ == '__main__':
+    configure_logging()
     manager = FileRevisionManager()
     manager.start_monitoring()
 
     try:
-        # No infinite loop here, the program will run until interrupted with KeyboardInterrupt
-        pass
+        # Block until interrupted; use daemon.py for a service with signal handling and a control socket.
+        while manager.is_running():
+            time.sleep(1)
 
     except KeyboardInterrupt:
         manager.stop_monitoring()
@@ -1,12 +1,15 @@
+import time
+import queue
 import tkinter as tk
 import tkinter.ttk as ttk
 import threading
-import csv
 import logging
-import json
-from tkinter import filedialog, simpledialog
-from file_revision import FileRevisionManager
-from pathlib import Path
+from tkinter import filedialog, messagebox, simpledialog
+from config_store import WATCHERS
+from config_table import ConfigTable
+from revision_view import RevisionWindow
+from log_panel import TextHandler, LogView, read_log_tail
+from logging_config import LOG_FILE, LOG_FORMAT, configure_logging
 from file_operations import (
     import_config_from_csv,
     export_config_to_csv,
@@ -14,23 +17,8 @@ from file_operations import (
     export_config_to_json,
 )
 
-LOG_FILE = "file_revision.log"
 MAX_LOG_LINES = 100
-
-
-class TextHandler(logging.Handler):
-    """Handler class for logging messages to a tkinter text widget."""
-
-    def __init__(self, text_widget):
-        super().__init__()
-        self.text_widget = text_widget
-
-    def emit(self, record):
-        log_entry = self.format(record)
-        self.text_widget.config(state=tk.NORMAL)
-        self.text_widget.insert(tk.END, log_entry + '\n')
-        self.text_widget.see(tk.END)
-        self.text_widget.config(state=tk.DISABLED)
+STARTUP_POLL_MS = 50
 
 
 class FileRevisionGUI(tk.Tk):
@@ -41,8 +29,17 @@ class FileRevisionGUI(tk.Tk):
         self.title("File Revision Manager")
         self.geometry("1000x900")
         self.dark_mode = False
-        self.manager = FileRevisionManager()
+        # The manager (and the watchdog stack it imports) is created on a background
+        # thread, so the window appears before the configuration is loaded.
+        self.manager = None
+        self.manager_buttons = []
         self._after_id = None
+        self._ui_queue = queue.Queue()  # callables from worker threads, run on the Tk loop
+        self._startup_started = time.perf_counter()
+        self._startup_timings = []
+        self._loaded_manager = None  # set by the startup thread as soon as it exists
+        self._closing = False
+        self._closed = False
         ttk.Style().configure("TButton", padding=6)
         ttk.Style().configure("TLabel", padding=6)
         ttk.Style().configure("TFrame", padding=6)
@@ -51,13 +48,16 @@ class FileRevisionGUI(tk.Tk):
         self.status_label = ttk.Label()
 
         self.init_ui()
-        self.thread = threading.Thread(target=self.monitor_files)
-        self.thread.daemon = True
-        self.thread.start()
+        self._record_phase("window")
 
         self.menu_bar = tk.Menu(self)
         self.config(menu=self.menu_bar)
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(STARTUP_POLL_MS, self._process_ui_queue)
+        self._startup_thread = threading.Thread(target=self._load_in_background, name="GuiStartup", daemon=True)
+        self._startup_thread.start()
+
     def init_ui(self):
         """Initialize the user interface."""
         self.create_scrollable_frame()
@@ -87,14 +87,15 @@ class FileRevisionGUI(tk.Tk):
         panel = ttk.LabelFrame(self, text="Status", padding=(10, 5))
         panel.pack(fill=tk.BOTH, padx=10, pady=5, expand=True)
 
-        self.status_label = ttk.Label(panel, text="Monitoring")
+        self.status_label = ttk.Label(panel, text="Loading configuration...")
         self.status_label.pack(side=tk.LEFT, padx=10, pady=5)
 
-        start_button = ttk.Button(panel, text="Start Monitoring", command=self.start_monitoring)
+        start_button = ttk.Button(panel, text="Start Monitoring", command=self.start_monitoring, state=tk.DISABLED)
         start_button.pack(side=tk.LEFT, padx=10, pady=5)
 
-        stop_button = ttk.Button(panel, text="Stop Monitoring", command=self.stop_monitoring)
+        stop_button = ttk.Button(panel, text="Stop Monitoring", command=self.stop_monitoring, state=tk.DISABLED)
         stop_button.pack(side=tk.LEFT, padx=10, pady=5)
+        self.manager_buttons += [start_button, stop_button]
 
         panel.pack_configure(padx=10, pady=5)
 
@@ -115,25 +116,9 @@ class FileRevisionGUI(tk.Tk):
         # Use ttk.Button for the other elements
         self._setup_config_buttons(label_frame)
 
-        self.load_file_config_data()
-
     def _setup_file_table(self, parent):
-        self.table = ttk.Treeview(parent, columns=('File Path', 'Revision Directory'), show="headings")
-
-        # Customize column headers
-        self.table.heading('File Path', text='File Path')
-        self.table.heading('Revision Directory', text='Revision Directory')
-
-        # Customize row appearance (e.g., alternating row colors)
-        self.table.tag_configure('evenrow', background='#f0f0f0')
-        self.table.tag_configure('oddrow', background='#ffffff')
-
-        # Load file configuration data and populate the Treeview
-        self.load_file_config_data()
-        for i, (path, revision_dir) in enumerate(self.manager.FILE_PATHS.items()):
-            tags = ('evenrow', 'oddrow')[i % 2]
-            self.table.insert("", tk.END, values=(str(path), revision_dir), tags=tags)
-
+        # Only the visible rows are materialized, so large configurations stay responsive.
+        self.table = ConfigTable(parent)
         self.table.pack(fill=tk.BOTH, expand=True)
 
     def _setup_search_bar(self, parent):
@@ -152,22 +137,146 @@ class FileRevisionGUI(tk.Tk):
         btn_frame = ttk.Frame(parent)
         btn_frame.pack(fill=tk.X, expand=True)
 
-        ttk.Button(btn_frame, text="Import", command=self.import_config).pack(side=tk.LEFT, padx=1, pady=1)
-        ttk.Button(btn_frame, text="Export", command=self.export_config).pack(side=tk.LEFT, padx=1, pady=1)
-        ttk.Button(btn_frame, text="Add", command=self.add_file_config).pack(side=tk.LEFT, padx=1, pady=1)
-        ttk.Button(btn_frame, text="Edit", command=self.edit_file_config).pack(side=tk.LEFT, padx=1, pady=1)
-        ttk.Button(btn_frame, text="Delete", command=self.delete_file_config).pack(side=tk.LEFT, padx=1, pady=1)
-        ttk.Button(btn_frame, text="Reload", command=self.reload_config).pack(side=tk.RIGHT, padx=1, pady=1)
+        # Everything here needs the manager, so the buttons stay disabled until it is loaded.
+        for text, command, side in (("Import", self.import_config, tk.LEFT),
+                                    ("Export", self.export_config, tk.LEFT),
+                                    ("Add", self.add_file_config, tk.LEFT),
+                                    ("Edit", self.edit_file_config, tk.LEFT),
+                                    ("Delete", self.delete_file_config, tk.LEFT),
+                                    ("Watcher", self.edit_file_watcher, tk.LEFT),
+                                    ("Revisions", self.show_revisions, tk.LEFT),
+                                    ("Reload", self.reload_config, tk.RIGHT)):
+            button = ttk.Button(btn_frame, text=text, command=command, state=tk.DISABLED)
+            button.pack(side=side, padx=1, pady=1)
+            self.manager_buttons.append(button)
 
     def load_file_config_data(self):
-        for item in self.table.get_children():
-            self.table.delete(item)
+        # Copied in one step: worker threads may change FILE_PATHS meanwhile.
+        self.table.set_rows(list(self.manager.FILE_PATHS.items()))
+
+    def _record_phase(self, phase):
+        now = time.perf_counter()
+        previous = self._startup_timings[-1][2] if self._startup_timings else self._startup_started
+        self._startup_timings.append((phase, now - previous, now))
+
+    def run_on_ui(self, callback, *args):
+        """Schedule callback(*args) on the Tk loop; safe to call from any thread."""
+        self._ui_queue.put((callback, args))
+
+    def _process_ui_queue(self):
+        while True:
+            try:
+                callback, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+            if self._closed:
+                return
+        self.after(STARTUP_POLL_MS, self._process_ui_queue)
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    def _load_in_background(self):
+        try:
+            # Importing the monitoring stack pulls in watchdog; keep it off the UI thread.
+            from file_revisioning import FileRevisionManager
+            self._record_phase("import")
+            manager = FileRevisionManager()
+            self._loaded_manager = manager
+            self._record_phase("manager")
+
+            def progress(done, total):
+                self.run_on_ui(self.set_status, f"Validating configuration... {done}/{total} files")
+
+            manager.FILE_PATHS = manager.load_config(progress=progress)
+            self._record_phase("config")
+            self.run_on_ui(self._on_config_loaded, manager)
+            if self._closing:
+                return
+            self.run_on_ui(self.set_status, f"Starting monitoring of {len(manager.FILE_PATHS)} files...")
+            manager.start_monitoring(load=False)
+            self._record_phase("monitoring")
+            self.run_on_ui(self._on_monitoring_changed)
+            timings = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds, _ in self._startup_timings)
+            total = self._startup_timings[-1][2] - self._startup_started
+            logging.info(f"GUI startup took {total:.2f}s ({timings})")
+        except Exception as e:
+            logging.error(f"Error during startup: {e}")
+            self.run_on_ui(self.set_status, f"Startup failed: {e}")
+
+    def _on_config_loaded(self, manager):
+        self.manager = manager
+        # Reloads after external edits to file_config.csv happen on the watcher's thread.
+        manager.reload_listeners.append(lambda: self.run_on_ui(self._on_config_changed))
+        self.load_file_config_data()
+        if self._closing:
+            return
+        for button in self.manager_buttons:
+            button.config(state=tk.NORMAL)
+
+    def _on_monitoring_changed(self):
+        if self._closing:
+            return
+        if self.manager.is_running():
+            self.set_status(f"Monitoring {len(self.manager.FILE_PATHS)} files")
+        else:
+            self.set_status("Stopped")
+
+    def _run_monitoring_action(self, action, status):
+        # Starting runs the catch-up scan and stopping drains the queue; neither should block the UI.
+        self.set_status(status)
 
-        for path, revision_dir in self.manager.FILE_PATHS.items():
-            self.table.insert("", tk.END, values=(path, revision_dir))
+        def run():
+            action()
+            self.run_on_ui(self._on_monitoring_changed)
 
-    def monitor_files(self):
-        self.manager.start_monitoring()
+        threading.Thread(target=run, name="MonitoringControl", daemon=True).start()
+
+    def _run_config_action(self, action, status, refresh=True):
+        # Reloading validates every path and importing adds a watch per file; both wait for
+        # monitor_lock, which the catch-up scan at start holds. Keep them off the Tk thread.
+        self.set_status(status)
+
+        def run():
+            try:
+                action()
+            except Exception as e:
+                logging.error(f"Error updating the configuration: {e}")
+            self.run_on_ui(self._on_config_changed if refresh else self._on_monitoring_changed)
+
+        threading.Thread(target=run, name="ConfigUpdate", daemon=True).start()
+
+    def _on_config_changed(self):
+        if self._closing:
+            return
+        self.load_file_config_data()
+        self._on_monitoring_changed()
+
+    def on_close(self):
+        """Stop monitoring before the window closes, so queued revisions are written and the stat cache saved."""
+        if self._closing:
+            return
+        self._closing = True
+        for button in self.manager_buttons:
+            button.config(state=tk.DISABLED)
+        self.set_status("Stopping monitoring...")
+
+        def run():
+            # A manager still starting up is stopped once its startup has finished.
+            self._startup_thread.join()
+            try:
+                if self._loaded_manager is not None:
+                    self._loaded_manager.stop_monitoring()
+            except Exception as e:
+                logging.error(f"Error stopping monitoring: {e}")
+            self.run_on_ui(self._finish_close)
+
+        threading.Thread(target=run, name="MonitoringShutdown", daemon=True).start()
+
+    def _finish_close(self):
+        self._closed = True
+        self.destroy()
 
     def create_log_panel(self):
         self.log_panel = ttk.LabelFrame(self, text="Log Panel", padding=(10, 5))
@@ -190,74 +299,88 @@ class FileRevisionGUI(tk.Tk):
         scroll.grid(row=0, column=1, sticky='ns')
         self.log_text.config(yscrollcommand=scroll.set)
 
-        self._load_initial_log_data()
-        self._configure_log_handler()
+        self.log_level_var = tk.StringVar(value="DEBUG")
+        level_box = ttk.Combobox(log_frame, textvariable=self.log_level_var, state="readonly", width=10,
+                                 values=("DEBUG", "INFO", "WARNING", "ERROR"))
+        level_box.grid(row=1, column=0, sticky="w", pady=(5, 0))
+        level_box.bind("<<ComboboxSelected>>",
+                       lambda event: self.log_view.set_level(logging.getLevelName(self.log_level_var.get())))
 
-        self.log_text.config(state=tk.DISABLED)
+        self._configure_log_handler()
+        self._load_initial_log_data()
+        self.log_view.start()
 
     def _load_initial_log_data(self):
-        with open(LOG_FILE, 'r') as f:
-            lines = f.readlines()
-            for line in lines[-MAX_LOG_LINES:]:
-                self.log_text.insert(tk.END, line)
-            self.log_text.see(tk.END)
+        self.log_view.load(read_log_tail(LOG_FILE, MAX_LOG_LINES))
 
     def _configure_log_handler(self):
-        text_handler = TextHandler(self.log_text)
-        formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] - %(message)s')
-        text_handler.setFormatter(formatter)
+        # Records are queued by whichever thread logs them and drawn in batches on the Tk loop.
+        text_handler = TextHandler()
+        text_handler.setFormatter(logging.Formatter(LOG_FORMAT))
         logging.getLogger().addHandler(text_handler)
+        self.log_view = LogView(self.log_text, text_handler)
 
     def start_monitoring(self):
-        self.manager.start_monitoring()
-        self.status_label.config(text="Monitoring")
+        self._run_monitoring_action(self.manager.start_monitoring, "Starting monitoring...")
 
     def stop_monitoring(self):
-        self.manager.stop_monitoring()
-        self.status_label.config(text="Stopped")
+        self._run_monitoring_action(self.manager.stop_monitoring, "Stopping monitoring...")
 
     def add_file_config(self):
         file_path = filedialog.askopenfilename()
         if file_path:
             revision_dir = simpledialog.askstring("Input", "Enter Revision Directory Name")
             if revision_dir:
-                self.manager.FILE_PATHS[file_path] = revision_dir
-                self.write_to_csv()
-                self.load_file_config_data()
+                file_path = self.manager.set_file_config(file_path, revision_dir)
+                self.table.insert(file_path, revision_dir)
 
     def edit_file_config(self):
-        selected_item = self.table.selection()
-        if not selected_item:
+        selected_row = self.table.selected_row()
+        if not selected_row:
             return
 
-        selected_item = selected_item[0]
-        file_path, revision_dir = self.table.item(selected_item, "values")
+        file_path, _, revision_dir = selected_row
         new_revision_dir = simpledialog.askstring("Input", "Edit Revision Directory Name", initialvalue=revision_dir)
 
         if new_revision_dir:
-            self.manager.FILE_PATHS[file_path] = new_revision_dir
-            self.write_to_csv()
-            self.load_file_config_data()
+            self.manager.set_file_config(file_path, new_revision_dir)
+            self.table.update(file_path, new_revision_dir)
 
-    def delete_file_config(self):
-        selected_item = self.table.selection()
-        if not selected_item:
+    def edit_file_watcher(self):
+        selected_row = self.table.selected_row()
+        if not selected_row:
+            return
+
+        file_path = selected_row[0]
+        watcher = simpledialog.askstring("Input", f"Watch with ({', '.join(WATCHERS)})",
+                                         initialvalue=self.manager.file_watcher(file_path))
+        if not watcher:
             return
+        watcher = watcher.strip().lower()
+        if watcher not in WATCHERS:
+            messagebox.showerror("Watcher", f"Choose one of {', '.join(WATCHERS)}.", parent=self)
+            return
+        self.manager.set_file_watcher(file_path, watcher)
+        logging.info(f"Watcher of {file_path} set to {watcher}")
 
-        selected_item = selected_item[0]
-        file_path_str, revision_dir = self.table.item(selected_item, "values")
+    def delete_file_config(self):
+        selected_row = self.table.selected_row()
+        if not selected_row:
+            return
 
-        # Convert the file_path_str to a WindowsPath object for comparison
-        file_path = Path(file_path_str)
+        file_path = selected_row[0]
 
-        if file_path in self.manager.FILE_PATHS:
-            del self.manager.FILE_PATHS[file_path]
-            self.write_to_csv()  # Update the CSV file
-            self.load_file_config_data()
+        if self.manager.remove_file_config(file_path) is not None:
+            self.table.delete(file_path)
             logging.info(f"File removed:{file_path}")
         else:
             logging.info(f"Error removing:{file_path}")
 
+    def show_revisions(self):
+        selected_row = self.table.selected_row()
+        if selected_row:
+            RevisionWindow(self, self.manager, selected_row[0])
+
     def on_entry_click(self):
         if self.search_entry.get().strip() == 'Search for files...':
             self.search_entry.delete(0, "end")
@@ -273,33 +396,14 @@ class FileRevisionGUI(tk.Tk):
 
     def reset_search(self):
         self.search_var.set("")
-        self.load_file_config_data()
+        self.table.filter("")
 
     def reload_config(self):
-        self.manager.reload_configuration()
-        self.load_file_config_data()
-
-    def write_to_csv(self):
-        config_file = 'file_config.csv'
-        with open(config_file, mode='w', newline='') as file:
-            fieldnames = ['file_path', 'revision_dir']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for path, revision_dir in self.manager.FILE_PATHS.items():
-                writer.writerow({'file_path': path, 'revision_dir': revision_dir})
+        # The table is refreshed by the manager's reload listener.
+        self._run_config_action(self.manager.reload_configuration, "Reloading configuration...", refresh=False)
 
     def search_files(self):
-        search_term = self.search_var.get().lower()
-
-        # Clear all items from the table
-        for item in self.table.get_children():
-            self.table.delete(item)
-
-        # Insert items that match the search term
-        for path, revision_dir in self.manager.FILE_PATHS.items():
-            if search_term in str(path).lower() or search_term in revision_dir.lower():
-                self.table.insert("", tk.END, values=(path, revision_dir))
+        self.table.filter(self.search_var.get())
 
     def delayed_search(self):
         """Initiate the search after a delay."""
@@ -315,12 +419,17 @@ class FileRevisionGUI(tk.Tk):
         filename = filedialog.askopenfilename(filetypes=filetypes)
 
         if filename.endswith('.csv'):
-            self.manager.FILE_PATHS = import_config_from_csv(filename, self.manager.FILE_PATHS)
+            read = import_config_from_csv
         elif filename.endswith('.json'):
-            self.manager.FILE_PATHS = import_config_from_json(filename, self.manager.FILE_PATHS)
+            read = import_config_from_json
+        else:
+            return
 
-        self.load_file_config_data()
-        self.write_to_csv()
+        def action():
+            # The whole batch is written to the configuration in a single pass.
+            self.manager.import_config(read(filename, {}).items())
+
+        self._run_config_action(action, f"Importing {filename}...")
 
     def export_config(self):
         filetypes = [("CSV files", "*.csv"), ("JSON files", "*.json")]
@@ -333,5 +442,6 @@ class FileRevisionGUI(tk.Tk):
 
 
 if __name__ == "__main__":
+    configure_logging()
     app = FileRevisionGUI()
     app.mainloop()
@@ -0,0 +1,44 @@
+import hashlib
+
+try:
+    import xxhash
+except ImportError:  # xxhash is optional, only needed for the non-cryptographic algorithms
+    xxhash = None
+
+DEFAULT_ALGORITHM = "md5"
+CHUNK_SIZE = 1024 * 1024
+XXHASH_ALGORITHMS = ("xxh64", "xxh3_64", "xxh3_128")
+
+
+def get_hasher(algorithm):
+    """Return a new hash object for algorithm (any hashlib name, or an xxhash variant)."""
+    if algorithm in XXHASH_ALGORITHMS:
+        if xxhash is None:
+            raise ValueError(f"Hash algorithm {algorithm} requires the xxhash package")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """Hash a file in fixed-size chunks so memory use does not depend on the file size."""
+    with open(path, "rb", buffering=0) as file:
+        return hash_fileobj(file, algorithm, chunk_size)
+
+
+def hash_fileobj(file, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """Hash an open binary file from its current position to the end."""
+    hasher = get_hasher(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        size = file.readinto(buffer)
+        if not size:
+            break
+        hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def hash_bytes(data, algorithm=DEFAULT_ALGORITHM):
+    hasher = get_hasher(algorithm)
+    hasher.update(data)
+    return hasher.hexdigest()
@@ -0,0 +1,117 @@
+import os
+import re
+import logging
+import tkinter as tk
+from collections import deque
+
+FLUSH_INTERVAL_MS = 100
+MAX_RECORDS_PER_FLUSH = 500
+MAX_WIDGET_LINES = 1000
+MAX_PENDING_RECORDS = 10000
+LEVEL_PATTERN = re.compile(r"\[(DEBUG|INFO|WARNING|ERROR|CRITICAL)\]")
+
+
+class TextHandler(logging.Handler):
+    """Logging handler that queues formatted records for the GUI thread.
+
+    ``emit`` may be called from any thread (watchdog's observer, workers), so
+    it never touches Tk; it only appends to a bounded deque that LogView
+    drains on the Tk event loop. When records arrive faster than they can be
+    shown, the oldest pending ones are dropped.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_RECORDS):
+        super().__init__()
+        self.pending = deque(maxlen=max_pending)
+
+    def emit(self, record):
+        try:
+            self.pending.append((record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def read_log_tail(path, max_lines, block_size=8192):
+    """Return the last max_lines lines of a text file, reading backwards from the end."""
+    try:
+        with open(path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            position = file.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= max_lines:
+                step = min(block_size, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+    except FileNotFoundError:
+        return []
+    lines = data.decode(errors="replace").splitlines()
+    return lines[-max_lines:]
+
+
+def line_level(line):
+    match = LEVEL_PATTERN.search(line)
+    return logging.getLevelName(match.group(1)) if match else logging.INFO
+
+
+class LogView:
+    """Shows log records in a Text widget as a bounded, level-filtered ring buffer.
+
+    Records are pulled from a TextHandler every FLUSH_INTERVAL_MS and inserted
+    in one batch, so bursts of log output cost one widget update per tick.
+    """
+
+    def __init__(self, text_widget, handler, max_lines=MAX_WIDGET_LINES):
+        self.text_widget = text_widget
+        self.handler = handler
+        self.max_lines = max_lines
+        self.level = logging.DEBUG
+        self.records = deque(maxlen=max_lines)  # (levelno, line), all levels
+        self._after_id = None
+
+    def load(self, lines):
+        self.records.extend((line_level(line), line) for line in lines)
+        self.render()
+
+    def set_level(self, level):
+        self.level = level
+        self.render()
+
+    def render(self):
+        """Redraw the widget from the ring buffer, e.g. after the level filter changes."""
+        lines = [line for levelno, line in self.records if levelno >= self.level]
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete("1.0", tk.END)
+        if lines:
+            self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+        self.text_widget.see(tk.END)
+        self.text_widget.config(state=tk.DISABLED)
+
+    def start(self):
+        self._after_id = self.text_widget.after(FLUSH_INTERVAL_MS, self.flush)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.text_widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def flush(self):
+        batch = []
+        pending = self.handler.pending
+        while pending and len(batch) < MAX_RECORDS_PER_FLUSH:
+            batch.append(pending.popleft())
+
+        if batch:
+            self.records.extend(batch)
+            lines = [line for levelno, line in batch if levelno >= self.level]
+            if lines:
+                self.text_widget.config(state=tk.NORMAL)
+                self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+                # Trim from the top so the widget never holds more than max_lines.
+                line_count = int(self.text_widget.index("end-1c").split(".")[0]) - 1
+                if line_count > self.max_lines:
+                    self.text_widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+                self.text_widget.see(tk.END)
+                self.text_widget.config(state=tk.DISABLED)
+
+        self._after_id = self.text_widget.after(FLUSH_INTERVAL_MS, self.flush)
@@ -0,0 +1,14 @@
+import logging
+
+LOG_FILE = "file_revision.log"
+LOG_FORMAT = '[%(asctime)s] [%(levelname)s] - %(message)s'
+
+
+def configure_logging(level=logging.INFO, log_file=LOG_FILE):
+    """Send log records to the log file and the console.
+
+    Called by the entry points (GUI, daemon, command line) rather than at import
+    time, so importing the monitoring modules has no side effects.
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT,
+                        handlers=[logging.FileHandler(log_file), logging.StreamHandler()])
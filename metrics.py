@@ -0,0 +1,288 @@
+import io
+import time
+import bisect
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from atomic_file import write_atomically
+
+PREFIX = "file_revision_"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+EXPORT_INTERVAL = 15.0
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        yield f"{self.name} {self.value}"
+
+
+class Gauge:
+    """A value that is set directly, or read from a function when the metrics are rendered."""
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logging.debug(f"Could not read gauge {self.name}: {e}")
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label value, like a Prometheus histogram.
+
+    An observation is a bisect and a few additions under a lock, so it is
+    cheap enough to record every stage of every revision.
+    """
+
+    def __init__(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self):
+        """{label value: (count, sum)} of every series."""
+        with self._lock:
+            return {key: (series[-1], series[-2]) for key, series in self._series.items()}
+
+    @contextmanager
+    def time(self, label_value=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label_value)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_value, series in sorted(snapshot.items(), key=lambda item: str(item[0])):
+            labels = [(self.label, label_value)] if self.label else []
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {series[-2]!r}"
+            yield f"{self.name}_count{_format_labels(labels)} {series[-1]}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(self.prefix + name, help_text))
+
+    def gauge(self, name, help_text, function=None):
+        return self._register(Gauge(self.prefix + name, help_text, function))
+
+    def histogram(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help_text, label, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics atomically, for the node_exporter textfile collector and the like."""
+        text = self.render()
+
+        def write(tmp_name):
+            with open(tmp_name, "w") as file:
+                file.write(text)
+
+        write_atomically(path, write, suffix=".prom")
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the log
+
+
+class MetricsExporter:
+    """Publishes a registry to a text file every ``interval`` seconds and/or over HTTP.
+
+    The HTTP endpoint only listens on localhost unless another host is given.
+    """
+
+    def __init__(self, registry, path=None, port=None, host="127.0.0.1", interval=EXPORT_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.server = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.port is not None and self.server is None:
+            self.server = ThreadingHTTPServer((self.host, self.port), _MetricsRequestHandler)
+            self.server.daemon_threads = True
+            self.server.registry = self.registry
+            threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True).start()
+            logging.info(f"Metrics endpoint listening on http://{self.host}:{self.server.server_port}/metrics")
+        if self.path is not None and self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            self._write()  # Leave the final values behind
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.registry.write(self.path)
+        except Exception as e:
+            logging.error(f"Error writing metrics to {self.path}: {e}")
+
+
+class ProfileCapture:
+    """cProfile capture that can be switched on and off while monitoring runs.
+
+    cProfile only sees the thread that enabled it, and from Python 3.12 only one
+    profiler can be active per process. Worker calls are therefore run through
+    ``call``, which runs them one at a time under a single profiler while a
+    capture is active; revisions are serialized for the length of a capture.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._profile = None
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._profile = cProfile.Profile()
+            self._calls = 0
+            self.active = True
+
+    def call(self, function, *args):
+        if not self.active:
+            return function(*args)
+        with self._lock:
+            if self._profile is None:
+                return function(*args)  # Stopped while this call was waiting
+            self._calls += 1
+            return self._profile.runcall(function, *args)
+
+    def stop(self, path=None, limit=40):
+        """Stop capturing. Dumps the stats to path and returns a cumulative-time summary."""
+        with self._lock:
+            self.active = False
+            profile, calls, self._profile = self._profile, self._calls, None
+        if profile is None or not calls:
+            return "No calls were profiled.\n"
+        stats = pstats.Stats(profile)
+        if path:
+            stats.dump_stats(path)
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats("cumulative").print_stats(limit)
+        return summary.getvalue()
+
+
+class AllocationCapture:
+    """tracemalloc capture that can be switched on and off at runtime."""
+
+    def start(self, frames=10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self, path=None, limit=25):
+        """Stop tracing. Dumps the snapshot to path and returns the top allocation sites."""
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not running.\n"
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        if path:
+            snapshot.dump(path)
+        lines = [str(stat) for stat in snapshot.statistics("lineno")[:limit]]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,178 @@
+import os
+import re
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from watchdog.events import FileModifiedEvent
+
+from stat_cache import stat_key
+
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 60.0
+POLL_WORKERS = 4
+# Filesystems on which inotify misses changes made by other hosts (or misses them entirely).
+POLLING_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "sshfs", "overlay", "fuse", "fuseblk", "davfs"}
+MOUNTS_FILE = "/proc/self/mounts"
+_MOUNT_ESCAPE = re.compile(r"\\([0-7]{3})")
+_UNSEEN = object()
+
+
+def read_mounts():
+    """(mount point, filesystem type) pairs, longest mount point first."""
+    mounts = []
+    try:
+        with open(MOUNTS_FILE) as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # Spaces and tabs in mount points are octal-escaped.
+                    mount_point = _MOUNT_ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), fields[1])
+                    mounts.append((mount_point, fields[2]))
+    except OSError:
+        pass
+    return sorted(mounts, key=lambda mount: len(mount[0]), reverse=True)
+
+
+def filesystem_type(path, mounts=None):
+    """Type of the filesystem holding path ("ext4", "nfs4", ...), or None if unknown."""
+    path = os.path.abspath(path)
+    for mount_point, fs_type in (read_mounts() if mounts is None else mounts):
+        if path == mount_point or path.startswith(mount_point.rstrip(os.sep) + os.sep):
+            return fs_type
+    return None
+
+
+def needs_polling(path, mounts=None):
+    fs_type = filesystem_type(path, mounts)
+    return fs_type is not None and (fs_type in POLLING_FILESYSTEMS or fs_type.startswith("fuse."))
+
+
+class PollingWatcher:
+    """Stat-based change detection for individual files.
+
+    Only the given files are checked, never whole directory trees. Files that
+    are due in the same directory are checked with one ``os.scandir`` call, and
+    directories are polled in parallel to hide network round trips. Each file
+    has its own interval: a change resets it to ``min_interval``, every quiet
+    poll doubles it up to ``max_interval``. Changes are reported to callback as
+    watchdog FileModifiedEvents, so they take the same path as native events.
+    """
+
+    def __init__(self, callback, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, workers=POLL_WORKERS):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.workers = workers
+        self._files = {}  # normalized path -> [stat key, interval, due]
+        self._heap = []  # (due, path); entries whose due no longer matches are stale
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def set_paths(self, paths):
+        """Poll exactly these normalized paths. New files get a baseline stat on their first poll."""
+        paths = set(paths)
+        now = time.monotonic()
+        with self._condition:
+            for path in [path for path in self._files if path not in paths]:
+                del self._files[path]
+            for path in paths:
+                if path not in self._files:
+                    self._files[path] = [_UNSEEN, self.min_interval, now]
+                    heapq.heappush(self._heap, (now, path))
+            self._condition.notify()
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="PollingWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _take_due(self):
+        """Pop the paths that are due, grouped by directory, or return the time to wait."""
+        now = time.monotonic()
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            when, path = heapq.heappop(self._heap)
+            state = self._files.get(path)
+            if state is None or state[2] != when:
+                continue  # Removed, or rescheduled since this entry was pushed
+            due.setdefault(os.path.dirname(path), []).append(path)
+        if due:
+            return due, None
+        return None, (self._heap[0][0] - now) if self._heap else None
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="PollingWatcher") as executor:
+            while True:
+                with self._condition:
+                    if not self._running:
+                        return
+                    due, timeout = self._take_due()
+                    if due is None:
+                        self._condition.wait(timeout)
+                        continue
+
+                results = {}
+                for directory_results in executor.map(self._stat_directory, due.items()):
+                    results.update(directory_results)
+                changed = self._update(results)
+                for path in changed:
+                    try:
+                        self.callback(FileModifiedEvent(path))
+                    except Exception as e:
+                        logging.error(f"Error handling polled change of {path}: {e}")
+
+    @staticmethod
+    def _stat_directory(item):
+        """{path: stat key or None} for the due files of one directory."""
+        directory, paths = item
+        results = dict.fromkeys(paths)
+        try:
+            if len(paths) == 1:
+                results[paths[0]] = stat_key(os.stat(paths[0]))
+                return results
+            names = {os.path.basename(path): path for path in paths}
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path = names.get(os.path.normcase(entry.name))
+                    if path is not None:
+                        results[path] = stat_key(entry.stat(), entry.inode())
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Polling {directory} failed: {e}")
+        return results
+
+    def _update(self, results):
+        changed = []
+        now = time.monotonic()
+        with self._condition:
+            for path, key in results.items():
+                state = self._files.get(path)
+                if state is None:
+                    continue
+                previous = state[0]
+                if previous is not _UNSEEN and key is not None and key != previous:
+                    changed.append(path)
+                    state[1] = self.min_interval
+                else:
+                    state[1] = min(state[1] * 2, self.max_interval)
+                state[0] = key
+                state[2] = now + state[1]
+                heapq.heappush(self._heap, (state[2], path))
+        return changed
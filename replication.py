@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import logging
+import tarfile
+import threading
+from collections import deque
+from pathlib import Path, PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import write_atomically
+from copy_engine import copy_file
+from revision_store import BlobStore, is_blob_pointer
+
+CHECKPOINT_FILE = 'file_revision.replication.jsonl'
+SMALL_REVISION_BYTES = 1024 * 1024
+BATCH_BYTES = 16 * 1024 * 1024
+BATCH_COUNT = 256
+BATCH_DELAY = 2.0
+UPLOAD_WORKERS = 4
+RETRY_DELAY = 30.0
+COPY_CHUNK = 256 * 1024
+
+
+def replication_key(revisions_dir, name):
+    """Target-side key of a revision: its absolute path without the root or drive."""
+    parts = Path(os.path.abspath(revisions_dir)).parts[1:]
+    return str(PurePosixPath(*parts, name))
+
+
+class RateLimiter:
+    """Token bucket, in bytes per second, shared by all uploads to one target."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self._allowance = bytes_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= amount
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _store_object(destination, write):
+    """Write an object to the target through write(temporary path).
+
+    Objects are synced before the rename, so a reader of the target never sees
+    a partial object and an object is on disk before its key is checkpointed.
+    """
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    write_atomically(destination, write, sync=True)
+
+
+def _copy_limited(source, destination, limiter):
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        while True:
+            data = src.read(COPY_CHUNK)
+            if not data:
+                break
+            if limiter is not None:
+                limiter.consume(len(data))
+            dst.write(data)
+
+
+class DirectoryTarget:
+    """Mirrors revisions into another (local or mounted) directory, keeping the key layout."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def put(self, key, source, limiter=None):
+        if limiter is None:
+            # Unthrottled copies can use reflinks or kernel-side copies.
+            _store_object(self.root / key, lambda tmp_name: copy_file(source, tmp_name))
+        else:
+            _store_object(self.root / key, lambda tmp_name: _copy_limited(source, tmp_name, limiter))
+
+    def put_batch(self, items, limiter=None):
+        for key, source in items:
+            self.put(key, source, limiter)
+
+
+class ObjectStoreTarget:
+    """Local stand-in for an object store such as S3.
+
+    Each large revision becomes one object under ``objects/<key>``. Small
+    revisions are packed into a single tar object under ``bundles/`` with a
+    JSON index next to it, so a batch costs one request instead of hundreds.
+    A real backend only has to implement the same put/put_batch methods.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def put(self, key, source, limiter=None):
+        _store_object(self.root / 'objects' / key, lambda tmp_name: _copy_limited(source, tmp_name, limiter))
+
+    def put_batch(self, items, limiter=None):
+        bundle_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+        def write_bundle(tmp_name):
+            with tarfile.open(tmp_name, mode='w') as bundle:
+                for key, source in items:
+                    if limiter is not None:
+                        limiter.consume(os.path.getsize(source))
+                    bundle.add(source, arcname=key)
+
+        def write_index(tmp_name):
+            with open(tmp_name, 'w') as file:
+                json.dump({'keys': [key for key, _ in items]}, file)
+
+        _store_object(self.root / 'bundles' / f'{bundle_id}.tar', write_bundle)
+        _store_object(self.root / 'bundles' / f'{bundle_id}.json', write_index)
+
+
+class ReplicationCheckpoint:
+    """Append-only record of the keys already stored on the target, kept across restarts."""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.keys = set()
+        self._lock = threading.Lock()
+
+    def load(self):
+        keys = set()
+        try:
+            with open(self.path, 'r') as file:
+                for line in file:
+                    try:
+                        keys.add(json.loads(line)['key'])
+                    except (ValueError, KeyError):
+                        continue  # A torn last line from a crash mid-append
+        except FileNotFoundError:
+            pass
+        self.keys = keys
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def mark(self, keys):
+        with self._lock:
+            with open(self.path, 'a') as file:
+                for key in keys:
+                    file.write(json.dumps({'key': key, 'time': time.time()}) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            self.keys.update(keys)
+
+
+class Replicator:
+    """Copies new revisions to a secondary target in the background.
+
+    Register ``on_revision`` as a revision listener; it only appends to an
+    in-memory queue, so revision creation never waits for the target.
+    Revisions smaller than ``small_revision_bytes`` are sent in batches; larger
+    ones are uploaded in parallel by ``upload_workers`` threads. All uploads
+    share an optional bandwidth limit. Keys are recorded in a checkpoint once
+    stored, and on start every monitored revision missing from the checkpoint is
+    queued again, so a restart resumes where it left off. Failed uploads are
+    retried after RETRY_DELAY seconds.
+    """
+
+    def __init__(self, manager, target, checkpoint_path=CHECKPOINT_FILE, bandwidth=None,
+                 upload_workers=UPLOAD_WORKERS, small_revision_bytes=SMALL_REVISION_BYTES,
+                 batch_bytes=BATCH_BYTES, batch_delay=BATCH_DELAY):
+        self.manager = manager
+        self.target = target
+        self.checkpoint = ReplicationCheckpoint(checkpoint_path)
+        self.limiter = RateLimiter(bandwidth) if bandwidth else None
+        self.upload_workers = upload_workers
+        self.small_revision_bytes = small_revision_bytes
+        self.batch_bytes = batch_bytes
+        self.batch_delay = batch_delay
+        self.replicated = 0
+        self._queue = deque()  # (key, revisions_dir, name)
+        self._queued_keys = set()
+        self._retries = []  # (retry time, item)
+        self._batch = []
+        self._batch_size = 0
+        self._batch_started = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="Replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop after the uploads in flight; anything still queued is picked up again on the next start."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def on_revision(self, file_path, revisions_dir, record):
+        self.enqueue(revisions_dir, record.name)
+
+    def enqueue(self, revisions_dir, name):
+        key = replication_key(revisions_dir, name)
+        with self._condition:
+            if key in self._queued_keys or key in self.checkpoint:
+                return
+            self._queued_keys.add(key)
+            self._queue.append((key, revisions_dir, name))
+            self._condition.notify()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._queued_keys)
+
+    def _resume(self):
+        """Queue every stored revision of the monitored files that the target does not have yet."""
+        self.checkpoint.load()
+        for key in list(self.manager.FILE_PATHS):
+            try:
+                revisions_dir = self.manager.revisions_dir_for(key)
+            except KeyError:
+                continue  # Removed from the configuration meanwhile
+            if revisions_dir.exists():
+                for record in self.manager.get_manifest(revisions_dir):
+                    self.enqueue(revisions_dir, record.name)
+        logging.info(f"Replication resumed with {self.pending_count()} revisions to send")
+
+    def _run(self):
+        try:
+            self._resume()
+        except Exception as e:
+            logging.error(f"Error scanning revisions for replication: {e}")
+        with ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="ReplicationUpload") as executor:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    while self._retries and self._retries[0][0] <= now:
+                        self._queue.append(self._retries.pop(0)[1])
+                    if not self._queue and self._running:
+                        self._condition.wait(self._wait_timeout(now))
+                    running = self._running
+                    items = [self._queue.popleft() for _ in range(min(len(self._queue), BATCH_COUNT))] \
+                        if running else []
+
+                for item in items:
+                    source = self._source_path(item)
+                    if source is None:
+                        continue
+                    size = os.path.getsize(source)
+                    if size >= self.small_revision_bytes:
+                        executor.submit(self._upload, [item], [source])
+                    else:
+                        self._batch.append((item, source))
+                        self._batch_size += size
+                        if self._batch_started is None:
+                            self._batch_started = time.monotonic()
+                        if self._batch_size >= self.batch_bytes or len(self._batch) >= BATCH_COUNT:
+                            self._flush_batch(executor)
+
+                if self._batch and (not running or time.monotonic() - self._batch_started >= self.batch_delay):
+                    self._flush_batch(executor)
+                if not running:
+                    return  # Leaving the executor block waits for the uploads in flight
+
+    def _wait_timeout(self, now):
+        deadlines = []
+        if self._batch:
+            deadlines.append(self._batch_started + self.batch_delay)
+        if self._retries:
+            deadlines.append(self._retries[0][0])
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def _source_path(self, item):
+        key, revisions_dir, name = item
+        path = Path(revisions_dir) / name
+        try:
+            if is_blob_pointer(path):
+                if self.manager.blob_store is None:
+                    raise FileNotFoundError(f"no blob store configured for {path}")
+                path = self.manager.blob_store.blob_path(*BlobStore.read_pointer(path))
+            os.stat(path)
+        except FileNotFoundError as e:
+            # Typically removed by retention before it could be sent.
+            logging.warning(f"Not replicating {key}: {e}")
+            with self._condition:
+                self._queued_keys.discard(key)
+            return None
+        return path
+
+    def _flush_batch(self, executor):
+        items = [item for item, _ in self._batch]
+        sources = [source for _, source in self._batch]
+        self._batch, self._batch_size, self._batch_started = [], 0, None
+        executor.submit(self._upload, items, sources)
+
+    def _upload(self, items, sources):
+        keys = [item[0] for item in items]
+        try:
+            if len(items) == 1 and os.path.getsize(sources[0]) >= self.small_revision_bytes:
+                self.target.put(keys[0], sources[0], self.limiter)
+            else:
+                self.target.put_batch(list(zip(keys, sources)), self.limiter)
+            self.checkpoint.mark(keys)
+        except Exception as e:
+            logging.error(f"Error replicating {len(keys)} revisions (retrying in {RETRY_DELAY:.0f}s): {e}")
+            with self._condition:
+                retry_at = time.monotonic() + RETRY_DELAY
+                self._retries.extend((retry_at, item) for item in items)
+                self._condition.notify()
+            return
+        with self._condition:
+            self._queued_keys.difference_update(keys)
+            self.replicated += len(keys)
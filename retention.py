@@ -0,0 +1,238 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+
+from delta import DeltaStore, KIND_DELTA, is_delta_revision, read_header
+from revision_store import BlobStore, is_blob_pointer
+from revision_index import revision_source
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# A blob handed out by the blob store this recently may have a pointer that is
+# about to be written, so it is not collected yet.
+BLOB_GRACE_PERIOD = 300.0
+
+
+@dataclass
+class RetentionPolicy:
+    """Which revisions of a file to keep.
+
+    The newest ``keep_last`` revisions and everything younger than ``horizon``
+    seconds are always kept. Beyond the horizon one revision is kept per hour,
+    day and week for the most recent ``hourly``, ``daily`` and ``weekly``
+    periods. If ``max_total_bytes`` is set, the oldest survivors in the whole
+    revisions directory (of any file sharing it) are dropped until the content
+    size of the kept revisions fits. The latest revision of a file is never
+    deleted.
+    """
+    keep_last: int = 10
+    horizon: float = DAY
+    hourly: int = 24
+    daily: int = 7
+    weekly: int = 4
+    max_total_bytes: int = None
+
+    def select_for_deletion(self, records, now=None):
+        """Return the records (oldest first) that fall outside this policy."""
+        now = time.time() if now is None else now
+        newest_first = list(reversed(records))
+        keep = set()
+        buckets = {HOUR: set(), DAY: set(), WEEK: set()}
+        limits = {HOUR: self.hourly, DAY: self.daily, WEEK: self.weekly}
+
+        for index, record in enumerate(newest_first):
+            if index < max(self.keep_last, 1) or now - record.timestamp < self.horizon:
+                keep.add(record.counter)
+                continue
+            for period, seen in buckets.items():
+                bucket = int(record.timestamp // period)
+                if bucket not in seen and len(seen) < limits[period]:
+                    seen.add(bucket)
+                    keep.add(record.counter)
+
+        return [record for record in records if record.counter not in keep]
+
+    def select_over_size(self, directory_records, doomed):
+        """Return the records (oldest first) to delete, besides doomed, so a directory fits max_total_bytes.
+
+        directory_records are all revisions in one revisions directory, of every
+        file that shares it.
+        """
+        if self.max_total_bytes is None:
+            return []
+        doomed = {record.counter for record in doomed}
+        kept = sorted((record for record in directory_records if record.counter not in doomed),
+                      key=lambda record: record.counter)
+        latest = {revision_source(record.name): record.counter for record in kept}
+        total = sum(record.size for record in kept)
+        over = []
+        for record in kept:
+            if total <= self.max_total_bytes:
+                break
+            if latest[revision_source(record.name)] != record.counter:
+                over.append(record)
+                total -= record.size
+        return over
+
+
+class RetentionEngine:
+    """Applies retention policies in the background, a bounded amount of work per tick.
+
+    Each tick goes through the monitored files until it has examined
+    ``max_files_per_tick`` files or deleted ``max_deletions_per_tick``
+    revisions, so revision creation is never held up for long. In dry-run
+    mode it only logs what it would delete.
+
+    ``file_policies`` maps file paths to the policy used instead of ``policy``.
+    With a blob store, blobs whose last pointer was deleted are collected at
+    the end of each pass over all files. Only the revisions of monitored files
+    are checked for references, so a blob store must not be shared with
+    revisions directories that are no longer monitored.
+    """
+
+    def __init__(self, manager, policy, file_policies=None, interval=60.0,
+                 max_deletions_per_tick=100, max_files_per_tick=500, dry_run=False):
+        self.manager = manager
+        self.policy = policy
+        self.file_policies = {os.path.normcase(os.path.abspath(path)): file_policy
+                              for path, file_policy in (file_policies or {}).items()}
+        self.interval = interval
+        self.max_deletions_per_tick = max_deletions_per_tick
+        self.max_files_per_tick = max_files_per_tick
+        self.dry_run = dry_run
+        self._queue = []
+        self._pass_started = False
+        self._blob_candidates = set()  # (algorithm, digest) of blobs whose pointers were deleted
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="RetentionEngine", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Error applying retention policy: {e}")
+
+    def policy_for(self, file_path):
+        return self.file_policies.get(os.path.normcase(os.path.abspath(file_path)), self.policy)
+
+    def plan(self, file_path):
+        """Return (revisions_dir, records to delete) for one monitored file."""
+        revisions_dir = self.manager.revisions_dir_for(file_path)
+        policy = self.policy_for(file_path)
+        if policy is None or not revisions_dir.exists():
+            return revisions_dir, []
+        manifest = self.manager.get_manifest(revisions_dir)
+        records = manifest.revisions_of(os.path.basename(os.path.normcase(os.path.abspath(file_path))))
+        doomed = policy.select_for_deletion(records)
+        if policy.max_total_bytes is not None:
+            # The size cap covers the whole directory, so it may also pick other files' revisions.
+            doomed = sorted(doomed + policy.select_over_size(list(manifest), doomed),
+                            key=lambda record: record.counter)
+        return revisions_dir, doomed
+
+    def tick(self):
+        """Process monitored files in round-robin order until this tick's budget is spent."""
+        files = deletions = 0
+        while files < self.max_files_per_tick and deletions < self.max_deletions_per_tick:
+            if not self._queue:
+                if self._pass_started:
+                    # Every file has been processed; the next tick starts a new pass.
+                    self._pass_started = False
+                    self.collect_blobs()
+                    return
+                self._queue = list(self.manager.FILE_PATHS)
+                self._pass_started = True
+                if not self._queue:
+                    return
+            file_path = self._queue[-1]
+            files += 1
+            if file_path not in self.manager.FILE_PATHS:
+                self._queue.pop()
+                continue
+
+            revisions_dir, doomed = self.plan(file_path)
+            if self.dry_run:
+                for record in doomed:
+                    logging.info(f"Retention (dry run) would delete {record.name} from {revisions_dir}")
+                self._queue.pop()
+                continue
+
+            batch = doomed[-(self.max_deletions_per_tick - deletions):]
+            for record in reversed(batch):  # Newest first, so delta chains stay readable
+                self.delete_revision(revisions_dir, record)
+            deletions += len(batch)
+            if len(batch) == len(doomed):
+                self._queue.pop()
+
+    def delete_revision(self, revisions_dir, record):
+        manifest = self.manager.get_manifest(revisions_dir)
+        file_name = revision_source(record.name)
+        with manifest.lock:
+            if manifest.latest(file_name) is record:
+                return
+            successor = manifest.successor(record.counter, file_name)
+            if successor is not None and is_delta_revision(successor.name):
+                # The next revision may be stored as a delta against this one; turn it into
+                # a full snapshot before its base disappears.
+                kind, _, base_name, _ = read_header(revisions_dir / successor.name)
+                if kind == KIND_DELTA and base_name == record.name:
+                    store = self.manager.delta_store or DeltaStore()
+                    data = store.read_revision(revisions_dir, successor.name)
+                    store.write_revision(revisions_dir, successor.name, data)
+
+            try:
+                if is_blob_pointer(record.name):
+                    self._blob_candidates.add(BlobStore.read_pointer(revisions_dir / record.name))
+                os.remove(revisions_dir / record.name)
+            except FileNotFoundError:
+                pass
+            manifest.remove(record.counter)
+        logging.info(f"Retention removed {record.name} from {revisions_dir}")
+
+    def collect_blobs(self):
+        """Delete the blobs whose pointers were removed and that no monitored revision still uses."""
+        blob_store = self.manager.blob_store
+        if blob_store is None or not self._blob_candidates:
+            return
+        candidates, self._blob_candidates = self._blob_candidates, set()
+        scan_started = time.time()
+        revisions_dirs = set()
+        for file_path in list(self.manager.FILE_PATHS):
+            try:
+                revisions_dirs.add(self.manager.revisions_dir_for(file_path))
+            except KeyError:
+                continue  # Removed from the configuration meanwhile
+        for revisions_dir in revisions_dirs:
+            if not revisions_dir.exists():
+                continue
+            for record in list(self.manager.get_manifest(revisions_dir)):
+                if is_blob_pointer(record.name):
+                    try:
+                        candidates.discard(BlobStore.read_pointer(revisions_dir / record.name))
+                    except FileNotFoundError:
+                        pass
+
+        deleted = 0
+        for algorithm, digest in candidates:
+            if blob_store.delete_unused(algorithm, digest, scan_started - BLOB_GRACE_PERIOD):
+                deleted += 1
+            elif blob_store.blob_path(algorithm, digest).exists():
+                self._blob_candidates.add((algorithm, digest))  # Used recently; check again next pass
+        if deleted:
+            logging.info(f"Retention removed {deleted} unreferenced blobs")
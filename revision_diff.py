@@ -0,0 +1,149 @@
+import os
+import mmap
+import difflib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from delta import common_prefix_length, common_suffix_length
+
+CACHE_BYTES = 64 * 1024 * 1024
+DIFF_CONTEXT = 3
+BINARY_SNIFF_BYTES = 8192
+_COUNT_CHUNK = 1024 * 1024
+
+
+class ContentCache:
+    """LRU cache of reconstructed revision contents, bounded by their total size.
+
+    Delta revisions are rebuilt from their chain on every read, so keeping the
+    recently viewed ones makes stepping back and forth through a history cheap.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes // 4:
+            return  # A single huge revision would evict everything else
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+@contextmanager
+def mapped_file(path):
+    """Map a file read-only. Empty files cannot be mapped and give b"" instead."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def is_binary(data):
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+
+def _count_lines(data, end):
+    return sum(data[start:min(start + _COUNT_CHUNK, end)].count(b"\n") for start in range(0, end, _COUNT_CHUNK))
+
+
+def _split_lines(data):
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def _format_range(start, stop):
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(a, b, from_label, to_label, context=DIFF_CONTEXT):
+    """Yield a unified diff between two byte buffers (bytes or mmap) as text lines.
+
+    The unchanged head and tail are skipped with slice comparisons, so only the
+    changed region plus its context is split into lines and handed to difflib.
+    With memory-mapped inputs the rest of a large file is never copied.
+    """
+    shortest = min(len(a), len(b))
+    prefix = common_prefix_length(a, b, shortest)
+    if prefix == len(a) == len(b):
+        return
+    if is_binary(a) or is_binary(b):
+        yield f"Binary files {from_label} and {to_label} differ\n"
+        return
+
+    # Start of the changed region: the beginning of the line holding the first difference,
+    # moved back by `context` lines. Both buffers are identical up to this point.
+    start = a.rfind(b"\n", 0, prefix) + 1
+    for _ in range(context):
+        if start == 0:
+            break
+        start = a.rfind(b"\n", 0, start - 1) + 1
+
+    # End of the changed region: the first line boundary inside the common tail, moved
+    # forward by `context` lines.
+    suffix = common_suffix_length(a, b, shortest - prefix)
+    newline = a.find(b"\n", len(a) - suffix)
+    end_a = len(a) if newline == -1 else newline + 1
+    for _ in range(context):
+        if end_a >= len(a):
+            break
+        newline = a.find(b"\n", end_a)
+        end_a = len(a) if newline == -1 else newline + 1
+    end_b = len(b) - (len(a) - end_a)
+
+    offset = _count_lines(a, start)
+    a_lines = _split_lines(a[start:end_a])
+    b_lines = _split_lines(b[start:end_b])
+
+    yield f"--- {from_label}\n"
+    yield f"+++ {to_label}\n"
+    matcher = difflib.SequenceMatcher(None, a_lines, b_lines)
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        yield (f"@@ -{_format_range(first[1] + offset, last[2] + offset)} "
+               f"+{_format_range(first[3] + offset, last[4] + offset)} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a_lines[i1:i2]:
+                    yield _diff_line(" ", line)
+                continue
+            if tag in ("replace", "delete"):
+                for line in a_lines[i1:i2]:
+                    yield _diff_line("-", line)
+            if tag in ("replace", "insert"):
+                for line in b_lines[j1:j2]:
+                    yield _diff_line("+", line)
+
+
+def _diff_line(marker, line):
+    if line.endswith("\n"):
+        return marker + line
+    return f"{marker}{line}\n\\ No newline at end of file\n"
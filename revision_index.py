@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from atomic_file import write_atomically
+from revision_store import BLOB_POINTER_SUFFIX, BlobStore, is_blob_pointer
+from delta import DELTA_SUFFIX, is_delta_revision, original_size
+
+MANIFEST_NAME = ".manifest.jsonl"
+FILE_NAME_PATTERN = re.compile(r"(\d+)_" + r"(.+?)_\d{2}-\d{2}-\d{4}")
+
+
+@dataclass
+class RevisionRecord:
+    counter: int
+    name: str
+    timestamp: float
+    size: int
+    algorithm: str = None
+    digest: str = None
+
+
+def revision_key(name):
+    """A revision name without its counter and date: "notes.txt.blob" for "004_notes_18-10-2026.txt.blob"."""
+    match = FILE_NAME_PATTERN.match(name)
+    return match.group(2) + name[match.end():] if match else None
+
+
+def revision_source(name):
+    """The name of the file a revision was saved from, whichever way it is stored, normcased."""
+    key = revision_key(name)
+    if key is None:
+        return None
+    for suffix in (BLOB_POINTER_SUFFIX, DELTA_SUFFIX):
+        if key.endswith(suffix):
+            key = key[:-len(suffix)]
+            break
+    return os.path.normcase(key)
+
+
+class RevisionManifest:
+    """Append-only log of the revisions stored in one revisions directory.
+
+    Every line of ``.manifest.jsonl`` is one operation (``add``, ``digest`` or
+    ``remove``). Replaying it gives the latest revision and the next counter
+    without listing or sorting the directory. The log is rebuilt from the
+    revision filenames whenever it is missing or older than the directory.
+
+    Files that use the same revisions directory name share a manifest, so
+    the latest revision is also tracked per source file name.
+    """
+
+    def __init__(self, revisions_dir, blob_store=None):
+        self.revisions_dir = Path(revisions_dir)
+        # Needed by rebuild() to size blob revisions by their content, not their pointer.
+        self.blob_store = blob_store
+        self.path = self.revisions_dir / MANIFEST_NAME
+        self.records = {}
+        self.latest_by_source = {}
+        self.reserved = set()  # counters handed out for revisions that are still being written
+        # Highest counter seen. Records are not always added in counter order: a delta
+        # computed outside the lock can finish after a later revision of another file.
+        self.last_counter = 0
+        # Held while a revision is being added or removed so counters and files stay in step.
+        self.lock = threading.RLock()
+        self._log_length = 0
+        self._load()
+
+    def _load(self):
+        if self._is_stale():
+            self.rebuild()
+            return
+
+        try:
+            with open(self.path, "r") as file:
+                for line in file:
+                    if line.strip():
+                        self._apply(json.loads(line))
+                        self._log_length += 1
+        except (OSError, ValueError) as e:
+            logging.warning(f"Rebuilding unreadable manifest {self.path}: {e}")
+            self.rebuild()
+
+    def _is_stale(self):
+        # Creating or deleting a revision file bumps the directory mtime. We always append
+        # to the manifest after touching the directory, so an older manifest means the
+        # directory was changed behind our back.
+        try:
+            manifest_mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return True
+        return self.revisions_dir.stat().st_mtime_ns > manifest_mtime
+
+    def _apply(self, entry):
+        op = entry.pop("op")
+        if op == "add":
+            self._track(RevisionRecord(**entry))
+        elif op == "digest":
+            record = self.records.get(entry["counter"])
+            if record:
+                record.algorithm = entry["algorithm"]
+                record.digest = entry["digest"]
+        elif op == "remove":
+            self._untrack(entry["counter"])
+
+    def _track(self, record):
+        self.records[record.counter] = record
+        self.last_counter = max(self.last_counter, record.counter)
+        source = revision_source(record.name)
+        latest = self.latest_by_source.get(source)
+        if latest is None or record.counter > latest.counter:
+            self.latest_by_source[source] = record
+
+    def _untrack(self, counter):
+        record = self.records.pop(counter, None)
+        if record is None:
+            return None
+        source = revision_source(record.name)
+        if self.latest_by_source.get(source) is record:
+            # Rare (retention never removes the latest revision), so a scan is fine here.
+            remaining = self.revisions_of(source)
+            if remaining:
+                self.latest_by_source[source] = remaining[-1]
+            else:
+                del self.latest_by_source[source]
+        return record
+
+    def rebuild(self):
+        """Recreate the manifest from the revision filenames in the directory."""
+        records = {}
+        with os.scandir(self.revisions_dir) as entries:
+            for entry in entries:
+                match = FILE_NAME_PATTERN.match(entry.name)
+                if not match or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                counter = int(match.group(1))
+                record = RevisionRecord(counter, entry.name, stat.st_mtime, stat.st_size)
+                try:
+                    self._set_content_size(record)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Could not size revision {entry.name} in {self.revisions_dir}: {e}")
+                records[counter] = record
+
+        self.records = {}
+        self.latest_by_source = {}
+        self.last_counter = 0
+        for counter in sorted(records):
+            self._track(records[counter])
+        self.compact()
+        logging.info(f"Rebuilt revision manifest for {self.revisions_dir} ({len(self.records)} revisions)")
+
+    def _set_content_size(self, record):
+        # Records hold the size of the saved content; pointer and delta files are much smaller.
+        path = self.revisions_dir / record.name
+        if is_blob_pointer(path):
+            record.algorithm, record.digest = BlobStore.read_pointer(path)
+            if self.blob_store is None:
+                raise ValueError("no blob store configured")
+            record.size = self.blob_store.blob_path(record.algorithm, record.digest).stat().st_size
+        elif is_delta_revision(path):
+            record.size = original_size(path)
+
+    def compact(self):
+        """Rewrite the log with one ``add`` line per live revision."""
+        def write(tmp_name):
+            with open(tmp_name, "w") as file:
+                for record in self.records.values():
+                    file.write(json.dumps({"op": "add", **asdict(record)}) + "\n")
+
+        write_atomically(self.path, write)
+        # The rename itself bumps the directory mtime, so touch the manifest afterwards
+        # to keep it from looking stale on the next load.
+        os.utime(self.path)
+        self._log_length = len(self.records)
+
+    def _append(self, entry):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+        self._log_length += 1
+        if self._log_length > 2 * len(self.records) + 100:
+            self.compact()
+
+    def touch(self):
+        """Mark the manifest current after a directory change that did not touch any revision."""
+        if self.path.exists():
+            os.utime(self.path)
+
+    def latest(self, file_name=None):
+        """The latest revision of file_name, or of the whole directory when it is None."""
+        if file_name is not None:
+            return self.latest_by_source.get(os.path.normcase(file_name))
+        if not self.records:
+            return None
+        return self.records[max(self.records)]
+
+    def next_counter(self):
+        # Counters stay unique per directory: they key the records and the log entries.
+        return max(self.last_counter, *self.reserved, 0) + 1
+
+    def reserve(self, counter):
+        """Keep counter from being handed out again until it is added or released."""
+        self.reserved.add(counter)
+
+    def release(self, counter):
+        self.reserved.discard(counter)
+
+    def successor(self, counter, file_name=None):
+        """The next revision after counter (of file_name, if given), or None."""
+        source = os.path.normcase(file_name) if file_name is not None else None
+        later = [other for other, record in self.records.items()
+                 if other > counter and (source is None or revision_source(record.name) == source)]
+        return self.records[min(later)] if later else None
+
+    def revisions_of(self, file_name):
+        """Records of the revisions saved from file_name, oldest first."""
+        source = os.path.normcase(file_name)
+        # Under the lock: a worker adding a record would otherwise change the dict mid-iteration.
+        with self.lock:
+            return [record for record in self.records.values() if revision_source(record.name) == source]
+
+    def add(self, record):
+        self.reserved.discard(record.counter)
+        self._track(record)
+        self._append({"op": "add", **asdict(record)})
+
+    def set_digest(self, counter, algorithm, digest):
+        record = self.records[counter]
+        record.algorithm = algorithm
+        record.digest = digest
+        self._append({"op": "digest", "counter": counter, "algorithm": algorithm, "digest": digest})
+
+    def remove(self, counter):
+        if self._untrack(counter) is not None:
+            self._append({"op": "remove", "counter": counter})
+
+    def __iter__(self):
+        """Iterate over a snapshot of the records, so other threads can keep adding revisions."""
+        with self.lock:
+            return iter(list(self.records.values()))
+
+    def __len__(self):
+        return len(self.records)
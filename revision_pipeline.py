@@ -0,0 +1,109 @@
+import logging
+import threading
+from collections import OrderedDict
+
+REVISION_WORKERS = 4
+MAX_QUEUED = 1000
+OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+
+class RevisionPipeline:
+    """Runs revision work on a pool of worker threads.
+
+    Different files are processed in parallel, but events for the same key
+    never run concurrently: a key that is being processed stays queued until
+    its worker finishes. A newer event for a queued key replaces the older
+    one, since a revision always reads the file's current content.
+
+    At most ``max_queued`` keys wait at a time. When the queue is full,
+    ``submit`` blocks (``overflow="block"``) or discards the oldest queued
+    event (``overflow="drop_oldest"``).
+    """
+
+    def __init__(self, callback, workers=REVISION_WORKERS, max_queued=MAX_QUEUED, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.callback = callback
+        self.workers = workers
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.dropped = 0
+        self._queued = OrderedDict()  # key -> event, oldest first
+        self._active = set()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._run, name=f"RevisionWorker-{index}", daemon=True)
+                         for index in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, drain=True):
+        """Stop the workers once every queued event is processed (or discarded, without drain)."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            if not drain:
+                self._queued.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, key, event):
+        with self._condition:
+            if key in self._queued:
+                self._queued[key] = event
+                return
+            while len(self._queued) >= self.max_queued:
+                if self.overflow == "drop_oldest":
+                    dropped_key, _ = self._queued.popitem(last=False)
+                    self.dropped += 1
+                    logging.warning(f"Revision queue full, dropped pending event for {dropped_key}")
+                elif self._running:
+                    self._condition.wait()
+                else:
+                    break  # Nothing will drain the queue any more; do not block forever
+            self._queued[key] = event
+            self._condition.notify_all()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._queued) + len(self._active)
+
+    def _next_ready(self):
+        # Keys already being processed are skipped, so at most `workers` entries are passed over.
+        for key in self._queued:
+            if key not in self._active:
+                return key, self._queued.pop(key)
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    ready = self._next_ready()
+                    if ready is not None:
+                        break
+                    if not self._running and not self._queued:
+                        return
+                    self._condition.wait()
+                key, event = ready
+                self._active.add(key)
+                self._condition.notify_all()  # A slot has been freed for blocked submitters
+
+            try:
+                self.callback(event)
+            except Exception as e:
+                logging.error(f"Error processing revision for {key}: {e}")
+            finally:
+                with self._condition:
+                    self._active.discard(key)
+                    self._condition.notify_all()
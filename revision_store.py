@@ -0,0 +1,77 @@
+import os
+import logging
+import threading
+from pathlib import Path
+
+from atomic_file import staged_file
+from copy_engine import copy_file
+
+BLOB_POINTER_SUFFIX = ".blob"
+
+
+class BlobStore:
+    """Content-addressed store shared by all monitored files.
+
+    Each distinct content is written once to ``<root>/objects/<algorithm>/<xx>/<digest>``.
+    Revisions only keep a small pointer file naming the blob, so saving the same
+    content again (in any file, or after a revert) costs no extra copy.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        # Orders store() against delete_unused(), so a blob is never deleted just after
+        # it was handed out for a new pointer.
+        self.lock = threading.Lock()
+
+    def blob_path(self, algorithm, digest):
+        return self.objects_dir / algorithm / digest[:2] / digest
+
+    def store(self, source_path, algorithm):
+        """Copy source_path into the store. Returns (digest, True if a new blob was written).
+
+        The content is hashed while it is copied to a temporary file, which is then
+        renamed to that digest. A file that changes during the copy is therefore
+        always stored under the digest of the bytes actually written.
+        """
+        # Write to a temporary name first so a crash never leaves a truncated blob behind.
+        with staged_file(self.objects_dir) as tmp_name:
+            digest = copy_file(source_path, tmp_name, algorithm)
+            blob_path = self.blob_path(algorithm, digest)
+            with self.lock:
+                # The blob's mtime records when it was last handed out.
+                if blob_path.exists():
+                    os.utime(blob_path)
+                    return digest, False
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, blob_path)
+                os.utime(blob_path)
+        logging.info(f"Stored new blob {algorithm}:{digest}")
+        return digest, True
+
+    def delete_unused(self, algorithm, digest, since):
+        """Delete a blob unless store() handed it out at or after since. Returns True if it was deleted."""
+        blob_path = self.blob_path(algorithm, digest)
+        with self.lock:
+            try:
+                if blob_path.stat().st_mtime >= since:
+                    return False
+                os.unlink(blob_path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    @staticmethod
+    def write_pointer(pointer_path, algorithm, digest):
+        Path(pointer_path).write_text(f"{algorithm}:{digest}\n")
+
+    @staticmethod
+    def read_pointer(pointer_path):
+        """Return (algorithm, digest) recorded in a revision pointer file."""
+        algorithm, _, digest = Path(pointer_path).read_text().strip().partition(":")
+        return algorithm, digest
+
+
+def is_blob_pointer(path):
+    return Path(path).name.endswith(BLOB_POINTER_SUFFIX)
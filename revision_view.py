@@ -0,0 +1,167 @@
+import logging
+import threading
+import datetime
+import tkinter as tk
+import tkinter.ttk as ttk
+from tkinter import messagebox
+
+COLUMNS = ('Revision', 'Name', 'Saved', 'Size')
+MAX_DIFF_LINES = 20000
+POLL_INTERVAL_MS = 50
+
+
+class RevisionWindow(tk.Toplevel):
+    """Lists the revisions of one monitored file, shows diffs and restores revisions.
+
+    Diffs and restores run on a background thread; the result is picked up
+    from the Tk loop, so a large file never freezes the main window. Only the
+    first MAX_DIFF_LINES lines of a diff are shown.
+    """
+
+    def __init__(self, parent, manager, file_path):
+        super().__init__(parent)
+        self.manager = manager
+        self.file_path = file_path
+        self.title(f"Revisions of {file_path}")
+        self.geometry("900x700")
+        self._diff_result = None
+        self._diff_thread = None
+        self._restore_thread = None
+        self._restore_error = None
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show='headings', height=10, selectmode='extended')
+        for column in COLUMNS:
+            self.tree.heading(column, text=column)
+        self.tree.column('Revision', width=70, anchor=tk.E)
+        self.tree.column('Size', width=100, anchor=tk.E)
+        self.tree.pack(fill=tk.X, padx=10, pady=5)
+
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill=tk.X, padx=10)
+        ttk.Button(button_frame, text="Diff with current", command=self.diff_with_current).pack(side=tk.LEFT, padx=1)
+        ttk.Button(button_frame, text="Diff selected", command=self.diff_selected).pack(side=tk.LEFT, padx=1)
+        ttk.Button(button_frame, text="Restore", command=self.restore).pack(side=tk.LEFT, padx=1)
+        ttk.Button(button_frame, text="Refresh", command=self.refresh).pack(side=tk.RIGHT, padx=1)
+
+        text_frame = ttk.Frame(self)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.diff_text = tk.Text(text_frame, wrap=tk.NONE, state=tk.DISABLED)
+        scroll = ttk.Scrollbar(text_frame, command=self.diff_text.yview)
+        self.diff_text.config(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.diff_text.pack(fill=tk.BOTH, expand=True)
+        self.diff_text.tag_configure('added', foreground='dark green')
+        self.diff_text.tag_configure('removed', foreground='red')
+        self.diff_text.tag_configure('hunk', foreground='blue')
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        try:
+            records = self.manager.list_revisions(self.file_path)
+        except KeyError as e:
+            logging.error(f"Cannot list revisions: {e}")
+            return
+        for record in reversed(records):
+            saved = datetime.datetime.fromtimestamp(record.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            self.tree.insert('', tk.END, iid=str(record.counter),
+                             values=(record.counter, record.name, saved, record.size))
+
+    def selected_counters(self):
+        return sorted(int(item) for item in self.tree.selection())
+
+    def diff_with_current(self):
+        counters = self.selected_counters()
+        if counters:
+            self.show_diff(counters[0], None)
+
+    def diff_selected(self):
+        counters = self.selected_counters()
+        if len(counters) == 2:
+            self.show_diff(counters[0], counters[1])
+        else:
+            messagebox.showinfo("Diff", "Select exactly two revisions to compare.", parent=self)
+
+    def show_diff(self, from_revision, to_revision):
+        if self._diff_thread is not None:
+            return  # One diff at a time
+        self._set_text("Computing diff...\n")
+
+        def compute():
+            lines = []
+            try:
+                for line in self.manager.diff_revisions(self.file_path, from_revision, to_revision):
+                    lines.append(line)
+                    if len(lines) >= MAX_DIFF_LINES:
+                        lines.append(f"... diff truncated after {MAX_DIFF_LINES} lines\n")
+                        break
+                if not lines:
+                    lines.append("No differences.\n")
+            except Exception as e:
+                lines = [f"Error computing diff: {e}\n"]
+            self._diff_result = lines
+
+        self._diff_thread = threading.Thread(target=compute, name="RevisionDiff", daemon=True)
+        self._diff_thread.start()
+        self.after(POLL_INTERVAL_MS, self._poll_diff)
+
+    def _poll_diff(self):
+        if self._diff_result is None:
+            self.after(POLL_INTERVAL_MS, self._poll_diff)
+            return
+        lines, self._diff_result, self._diff_thread = self._diff_result, None, None
+        self.diff_text.config(state=tk.NORMAL)
+        self.diff_text.delete('1.0', tk.END)
+        for line in lines:
+            tag = ()
+            if line.startswith('@@'):
+                tag = ('hunk',)
+            elif line.startswith('+') and not line.startswith('+++'):
+                tag = ('added',)
+            elif line.startswith('-') and not line.startswith('---'):
+                tag = ('removed',)
+            self.diff_text.insert(tk.END, line, tag)
+        self.diff_text.config(state=tk.DISABLED)
+
+    def _set_text(self, text):
+        self.diff_text.config(state=tk.NORMAL)
+        self.diff_text.delete('1.0', tk.END)
+        self.diff_text.insert(tk.END, text)
+        self.diff_text.config(state=tk.DISABLED)
+
+    def restore(self):
+        counters = self.selected_counters()
+        if len(counters) != 1:
+            messagebox.showinfo("Restore", "Select one revision to restore.", parent=self)
+            return
+        if self._restore_thread is not None:
+            return  # One restore at a time
+        if not messagebox.askyesno("Restore", f"Replace {self.file_path} with revision {counters[0]}?", parent=self):
+            return
+        self._set_text(f"Restoring revision {counters[0]}...\n")
+
+        def run():
+            try:
+                self.manager.restore_revision(self.file_path, counters[0])
+                self._restore_error = ""
+            except Exception as e:
+                logging.error(f"Error restoring revision {counters[0]} of {self.file_path}: {e}")
+                self._restore_error = str(e)
+
+        self._restore_error = None
+        self._restore_thread = threading.Thread(target=run, name="RevisionRestore", daemon=True)
+        self._restore_thread.start()
+        self.after(POLL_INTERVAL_MS, self._poll_restore)
+
+    def _poll_restore(self):
+        if self._restore_error is None:
+            self.after(POLL_INTERVAL_MS, self._poll_restore)
+            return
+        error, self._restore_error, self._restore_thread = self._restore_error, None, None
+        if error:
+            self._set_text(f"Restore failed: {error}\n")
+            messagebox.showerror("Restore", error, parent=self)
+        else:
+            self._set_text("Restored.\n")
+        self.refresh()
@@ -0,0 +1,121 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import write_atomically
+
+STAT_CACHE_FILE = 'file_revision.statcache.json'
+SCAN_WORKERS = 16
+
+
+def stat_key(stat, inode=None):
+    return (stat.st_ino if inode is None else inode, stat.st_size, stat.st_mtime_ns)
+
+
+class StatCache:
+    """(inode, size, mtime_ns) of each monitored file as of its last revision.
+
+    It is saved when monitoring stops, so the catch-up scan at the next start
+    can skip unchanged files without opening or hashing them. An out-of-date
+    cache (after a crash) only costs extra hashing: duplicates are still
+    detected by checksum.
+    """
+
+    def __init__(self, path=STAT_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, mode='r') as file:
+                entries = {path: tuple(key) for path, key in json.load(file).items()}
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable stat cache {self.path}: {e}")
+            entries = {}
+        with self.lock:
+            self.entries = entries
+            self.loaded = True
+            self._dirty = False
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def record(self, path, key):
+        with self.lock:
+            if self.entries.get(path) != key:
+                self.entries[path] = key
+                self._dirty = True
+
+    def save(self, paths=None):
+        """Write the cache atomically, keeping only the given paths when they are passed."""
+        with self.lock:
+            if paths is not None:
+                stale = [path for path in self.entries if path not in paths]
+                for path in stale:
+                    del self.entries[path]
+                self._dirty = self._dirty or bool(stale)
+            if not self._dirty:
+                return
+            entries = dict(self.entries)
+            self._dirty = False
+
+        def write(tmp_name):
+            with open(tmp_name, mode='w') as file:
+                json.dump(entries, file)
+
+        write_atomically(self.path, write, suffix='.json')
+
+
+def scan_changed(paths, cache, workers=SCAN_WORKERS):
+    """Compare the monitored files against the stat cache.
+
+    paths are normalized file paths. Each directory is listed once with
+    ``os.scandir``, and directories are scanned in parallel. Returns two lists
+    of (path, stat key): files whose stat differs from the cached one, and
+    files that have no cache entry yet.
+    """
+    by_directory = {}
+    for path in paths:
+        directory, name = os.path.split(path)
+        by_directory.setdefault(directory, {})[name] = path
+
+    def scan_directory(item):
+        directory, names = item
+        changed, unknown = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path = names.get(os.path.normcase(entry.name))
+                    if path is None:
+                        continue
+                    try:
+                        key = stat_key(entry.stat(), entry.inode())
+                    except OSError:
+                        continue
+                    cached = cache.get(path)
+                    if cached is None:
+                        unknown.append((path, key))
+                    elif cached != key:
+                        changed.append((path, key))
+        except OSError as e:
+            logging.warning(f"Catch-up scan could not list {directory}: {e}")
+        return changed, unknown
+
+    changed, unknown = [], []
+    if not by_directory:
+        return changed, unknown
+    with ThreadPoolExecutor(max_workers=min(workers, len(by_directory))) as executor:
+        for directory_changed, directory_unknown in executor.map(scan_directory, by_directory.items()):
+            changed.extend(directory_changed)
+            unknown.extend(directory_unknown)
+    return changed, unknown